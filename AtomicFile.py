@@ -0,0 +1,29 @@
+"""
+Writes files so that a reader, in this process or another, never sees one partly written.
+"""
+
+from contextlib import contextmanager
+import os
+import threading
+
+
+"""
+Opens a temporary file next to path for writing, then renames it over path once the block is done. If the block
+raises, the temporary file is removed and path is left as it was.
+
+Args:
+	path (string): file to write
+	mode (string): mode to open the temporary file with, 'wb' for binary
+"""
+@contextmanager
+def atomic_file(path, mode='w'):
+	# Named for the process and thread, so writers of the same path do not share a temporary file
+	temporary_path = '%s.%d.%d' % (path, os.getpid(), threading.current_thread().ident)
+	try:
+		with open(temporary_path, mode) as temporary_file:
+			yield temporary_file
+		os.rename(temporary_path, path)
+	except:
+		if os.path.exists(temporary_path):
+			os.remove(temporary_path)
+		raise
@@ -0,0 +1,206 @@
+"""
+Offline benchmarks for the solver, runs every scenario under every solver configuration.
+
+Scenarios are generated from fixed seeds so nodes, backtracks and constraint checks are the same on every run.
+They are compared to benchmark_baseline.json, any counter going up is reported as a regression and the script exits
+with status 1. A counter going down is reported too, the baseline should be updated in the same commit so the gain
+is kept. Times depend on the machine the baseline was recorded on, so they are only compared with --check-time,
+growing more than the tolerance is then a regression.
+
+Usage:
+	python Benchmarks.py [--update-baseline] [--repeat N] [--check-time] [--tolerance X] [scenario ...]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+from ConstraintSolver import Variable, Constraint, ConstraintSatisfactionProblem, UNASSIGNED, positional
+from ConstraintParser import create_variables, create_problem
+from CatalogGenerator import generate_catalog, generate_parameters
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Keyword arguments for create_problem or ConstraintSatisfactionProblem in each configuration
+CONFIGURATIONS = [
+	('default', {}),
+	('chronological', {'backjumping': False}),
+	('tables', {'use_tables': True}),
+	('restarts', {'restarts': True})
+]
+
+
+"""
+Builds a scheduling problem from a generated catalog, the solver keeps state on variables so every run gets new ones
+"""
+def schedule_scenario(seed, courses, sections, tightness):
+	def build(use_tables=False, backjumping=True, restarts=False):
+		catalog = generate_catalog(seed, courses, sections, tightness)
+		parameters = generate_parameters(seed, catalog, tightness)
+		problem = create_problem(create_variables(catalog), parameters, use_tables)
+		problem.backjumping = backjumping
+		problem.restarts = restarts
+		return problem
+	return build
+
+
+def queens_scenario(size):
+	def build(use_tables=False, backjumping=True, restarts=False):
+		variables = [Variable('Q' + str(column), range(size)) for column in xrange(size)]
+		constraints = []
+		for i in xrange(size):
+			for j in xrange(i):
+				constraints.append(Constraint([variables[j], variables[i]], queens_safe, distance=i - j))
+		return ConstraintSatisfactionProblem(variables, constraints, use_tables, backjumping, restarts=restarts)
+	return build
+
+
+@positional
+def queens_safe(variables, values, extras):
+	if values[0] is UNASSIGNED or values[1] is UNASSIGNED:
+		return True
+	return values[0] != values[1] and abs(values[0] - values[1]) != extras['distance']
+
+
+"""
+Colors a random graph with edge probability density, seeded so the graph is the same every run
+"""
+def coloring_scenario(seed, nodes, density, colors):
+	def build(use_tables=False, backjumping=True, restarts=False):
+		rnd = random.Random(seed)
+		variables = [Variable('N' + str(node), range(colors)) for node in xrange(nodes)]
+		constraints = []
+		for i in xrange(nodes):
+			for j in xrange(i):
+				if rnd.random() < density:
+					constraints.append(Constraint([variables[j], variables[i]], colors_differ))
+		return ConstraintSatisfactionProblem(variables, constraints, use_tables, backjumping, restarts=restarts)
+	return build
+
+
+@positional
+def colors_differ(variables, values, extras):
+	return values[0] is UNASSIGNED or values[1] is UNASSIGNED or values[0] != values[1]
+
+
+SCENARIOS = [
+	('catalog-small-loose', schedule_scenario(1, 6, 4, 0.2)),
+	('catalog-small-tight', schedule_scenario(2, 6, 4, 0.8)),
+	('catalog-medium-loose', schedule_scenario(3, 12, 6, 0.2)),
+	('catalog-medium-tight', schedule_scenario(2, 12, 6, 0.8)),
+	('catalog-large-loose', schedule_scenario(5, 24, 8, 0.2)),
+	('catalog-large-tight', schedule_scenario(6, 24, 8, 0.8)),
+	('queens-8', queens_scenario(8)),
+	('queens-16', queens_scenario(16)),
+	('coloring-30', coloring_scenario(7, 30, 0.2, 4)),
+	('coloring-60', coloring_scenario(8, 60, 0.1, 4))
+]
+
+
+"""
+Solves a scenario repeat times in one configuration.
+
+Returns:
+	dictionary<string, ?> fastest solve time in seconds, whether a solution was found, and the search counters
+"""
+def run_benchmark(build, options, repeat):
+	result = None
+	for attempt in xrange(repeat):
+		problem = build(**options)
+		start = time.time()
+		solution = problem.solve()
+		elapsed = time.time() - start
+		statistics = problem.statistics()
+		if result is None or elapsed < result['time']:
+			result = {
+				'time': elapsed,
+				'solved': solution is not None,
+				'nodes': statistics.nodes,
+				'backtracks': statistics.backtracks,
+				'checks': statistics.total_checks()
+			}
+	return result
+
+
+"""
+Lists the regressions of a result against its baseline, deterministic counters may not grow at all
+
+Args:
+	tolerance (number): most the time may grow by as a factor, None to not compare times
+"""
+def compare(result, baseline, tolerance):
+	regressions = []
+	if result['solved'] != baseline['solved']:
+		regressions.append('solved %s, was %s' % (result['solved'], baseline['solved']))
+	for counter in ('nodes', 'backtracks', 'checks'):
+		if result[counter] > baseline[counter]:
+			regressions.append('%s %d, was %d' % (counter, result[counter], baseline[counter]))
+	# Very short runs are mostly timer noise
+	if tolerance is not None and result['time'] > baseline['time'] * tolerance and result['time'] - baseline['time'] > 0.01:
+		regressions.append('time %.3fs, was %.3fs' % (result['time'], baseline['time']))
+	return regressions
+
+
+"""
+Lists the counters of a result below its baseline, which is out of date if any are
+"""
+def improvements(result, baseline):
+	return ['%s %d, was %d' % (counter, result[counter], baseline[counter]) for counter in ('nodes', 'backtracks', 'checks')
+		if result[counter] < baseline[counter]]
+
+
+def main(arguments):
+	update = '--update-baseline' in arguments
+	check_time = '--check-time' in arguments
+	repeat = 3
+	tolerance = 1.5
+	names = []
+	arguments = [argument for argument in arguments if argument not in ('--update-baseline', '--check-time')]
+	while arguments:
+		argument = arguments.pop(0)
+		if argument == '--repeat':
+			repeat = int(arguments.pop(0))
+		elif argument == '--tolerance':
+			tolerance = float(arguments.pop(0))
+		else:
+			names.append(argument)
+
+	baseline = {}
+	if os.path.exists(BASELINE_PATH):
+		with open(BASELINE_PATH) as baseline_file:
+			baseline = json.load(baseline_file)
+
+	regressed = False
+	stale = False
+	print '%-22s %-14s %9s %7s %10s %10s %12s' % ('scenario', 'configuration', 'time', 'solved', 'nodes', 'backtracks', 'checks')
+	for name, build in SCENARIOS:
+		if names and name not in names:
+			continue
+		for configuration, options in CONFIGURATIONS:
+			key = '%s/%s' % (name, configuration)
+			result = run_benchmark(build, options, repeat)
+			print '%-22s %-14s %8.3fs %7s %10d %10d %12d' % (name, configuration, result['time'], result['solved'],
+				result['nodes'], result['backtracks'], result['checks'])
+			if update:
+				baseline[key] = result
+			elif key in baseline:
+				for regression in compare(result, baseline[key], tolerance if check_time else None):
+					print '    REGRESSION %s: %s' % (key, regression)
+					regressed = True
+				for improvement in improvements(result, baseline[key]):
+					print '    IMPROVED %s: %s' % (key, improvement)
+					stale = True
+
+	if update:
+		with open(BASELINE_PATH, 'w') as baseline_file:
+			json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+		print 'Wrote %s' % BASELINE_PATH
+	elif stale:
+		print 'Counters are below the baseline, run with --update-baseline to keep the gains'
+	return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
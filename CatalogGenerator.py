@@ -0,0 +1,89 @@
+"""
+Generates synthetic course catalogs for benchmarking without the network.
+
+Catalogs have the same shape as the course website's json, as given by CatalogLoader.load_classes.
+A seed always gives the same catalog. Tightness between 0 and 1 squeezes meetings into fewer time slots
+and makes the generated schedule parameters stricter, so more sections collide and fewer schedules exist.
+"""
+
+import random
+
+SCHOOLS = ['CS', 'MATH', 'PHYS', 'CHEM', 'ENGL', 'HIST', 'ECON', 'BIOL']
+PROFESSORS = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jones']
+
+# Meeting patterns as (days, minutes), weighted towards lectures
+PATTERNS = [
+	(('monday', 'wednesday', 'friday'), 50),
+	(('monday', 'wednesday', 'friday'), 50),
+	(('tuesday', 'thursday'), 75),
+	(('tuesday', 'thursday'), 75),
+	(('monday', 'wednesday'), 75),
+	(('monday',), 170),
+	(('wednesday',), 170),
+	(('thursday',), 110)
+]
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def format_time(minutes):
+	return '2000-01-01T%d:%02d:00Z' % (minutes // 60, minutes % 60)
+
+
+"""
+Generates a catalog.
+
+Args:
+	seed (int): seed for the random choices
+	courses (int): number of classes
+	sections (int): most sections of each class, each class gets between half and all of them
+	tightness (number): 0 spreads meetings from 8:00 to 20:00, 1 puts them all between 10:00 and 14:00
+Returns:
+	list<(dictionary, list<dictionary>)>
+	the class info and its sections for each class
+"""
+def generate_catalog(seed, courses, sections, tightness=0.5):
+	rnd = random.Random(seed)
+	earliest = int(8 * 60 + tightness * 2 * 60)
+	latest = int(20 * 60 - tightness * 6 * 60)
+	catalog = []
+	numbers = rnd.sample(xrange(1000, 5000), courses)
+	for number in numbers:
+		school = rnd.choice(SCHOOLS)
+		class_sections = []
+		for index in xrange(rnd.randint(max(1, sections // 2), sections)):
+			meetings = []
+			for days, length in rnd.sample(PATTERNS, rnd.choice([1, 1, 1, 2])):
+				# Starts on the half hour, lecture and lab of one section may share a day
+				start = earliest + 30 * rnd.randint(0, max(0, (latest - length - earliest) // 30))
+				meeting = dict((day, day in days) for day in DAYS)
+				meeting['start_time'] = format_time(start)
+				meeting['end_time'] = format_time(start + length)
+				meetings.append(meeting)
+			class_sections.append({'name': chr(ord('A') + index % 26) + str(index // 26 or ''), 'meetings': meetings})
+		class_info = {
+			'school': school,
+			'name': str(number),
+			'credits': str(rnd.choice([1, 3, 3, 3, 4, 4])),
+			'professor': rnd.choice(PROFESSORS),
+			'sections': [{'name': section['name']} for section in class_sections]
+		}
+		catalog.append((class_info, class_sections))
+	return catalog
+
+
+"""
+Generates schedule parameters for a catalog, see ConstraintParser.create_schedule.
+Tighter parameters need more classes and a shorter day.
+"""
+def generate_parameters(seed, catalog, tightness=0.5):
+	rnd = random.Random(seed)
+	credits = sorted(float(class_info['credits']) for class_info, sections in catalog)
+	total = sum(credits)
+	needed = rnd.sample(catalog, min(len(catalog), 1 + int(tightness * 3)))
+	return {
+		'min_hours': min(total, round(total * (0.3 + 0.3 * tightness))),
+		'max_hours': max(credits[-1], round(total * (0.8 - 0.2 * tightness))),
+		'day_start': format_time(8 * 60 + int(tightness * 90) // 30 * 30),
+		'day_end': format_time(20 * 60 - int(tightness * 180) // 30 * 30),
+		'classes_needed': [class_info['school'] + ' ' + class_info['name'] for class_info, sections in needed]
+	}
@@ -0,0 +1,150 @@
+"""
+Loads class and section json from the course catalog.
+
+Requests run concurrently on a bounded pool of threads, each reusing one keep-alive connection.
+Responses are cached on disk. A cached response younger than the ttl is used without a request, an older one
+is revalidated with its ETag so an unchanged catalog costs a 304 instead of the whole body.
+"""
+
+from multiprocessing.pool import ThreadPool
+import hashlib
+import httplib
+import json
+import os
+import socket
+import threading
+import time
+import urlparse
+
+from AtomicFile import atomic_file
+
+
+class CatalogLoader:
+	"""
+	Args:
+		base_url (string): url that school, class and section paths are appended to
+		cache_dir (string): directory for cached responses, None to not cache
+		ttl (number): seconds a cached response is used before it is revalidated
+		threads (int): most requests in flight at once
+		timeout (number): seconds to wait on the server
+	"""
+	def __init__(self, base_url='http://course.us.to/school', cache_dir=os.path.expanduser('~/.cache/CspScheduler'),
+			ttl=24 * 60 * 60, threads=8, timeout=30):
+		url = urlparse.urlparse(base_url)
+		self.host = url.hostname
+		self.port = url.port
+		self.base_path = url.path.rstrip('/')
+		self.cache_dir = cache_dir
+		self.ttl = ttl
+		self.threads = threads
+		self.timeout = timeout
+		self.local = threading.local()
+		# Counts of how each response was served, for checking the cache works
+		self.downloads = 0
+		self.revalidated = 0
+		self.cache_hits = 0
+		self.lock = threading.Lock()
+		if cache_dir is not None and not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+
+	"""
+	Loads every class and its sections.
+
+	Args:
+		class_names (list<string>): classes in the format '[school] [number]', ex. 'CS 1332'
+	Returns:
+		list<(dictionary, list<dictionary>)>
+		the class info and its list of sections for each class, in the order given
+	"""
+	def load_classes(self, class_names):
+		class_names = [name.split(' ') for name in class_names]
+		pool = ThreadPool(self.threads)
+		try:
+			classes = pool.map(self.fetch_json, ['/%s/%s.json' % (school, number) for school, number in class_names])
+			section_paths = []
+			for (school, number), class_info in zip(class_names, classes):
+				# Doesn't store school properly in json, fix
+				class_info['school'] = school
+				section_paths.append(['/%s/%s/%s.json' % (school, number, section['name']) for section in class_info['sections']])
+			# Fetch every section of every class together, then split them back up by class
+			sections = pool.map(self.fetch_json, [path for paths in section_paths for path in paths])
+		finally:
+			pool.close()
+			pool.join()
+
+		loaded = []
+		for class_info, paths in zip(classes, section_paths):
+			loaded.append((class_info, sections[:len(paths)]))
+			sections = sections[len(paths):]
+		return loaded
+
+	"""
+	Gets the parsed json at a path below base_url, from the cache if it is fresh enough.
+	"""
+	def fetch_json(self, path):
+		cached = self.read_cache(path)
+		if cached is not None and time.time() - cached['fetched'] < self.ttl:
+			self.count('cache_hits')
+			return cached['body']
+
+		headers = {}
+		if cached is not None and cached.get('etag'):
+			headers['If-None-Match'] = cached['etag']
+		status, etag, body = self.request(self.base_path + path, headers)
+		if status == httplib.NOT_MODIFIED and cached is not None:
+			self.count('revalidated')
+			cached['fetched'] = time.time()
+			self.write_cache(path, cached)
+			return cached['body']
+		if status != httplib.OK:
+			raise IOError('Catalog request for %s failed with status %d' % (path, status))
+		self.count('downloads')
+		cached = {'etag': etag, 'fetched': time.time(), 'body': json.loads(body)}
+		self.write_cache(path, cached)
+		return cached['body']
+
+	"""
+	Makes a GET request on this thread's connection, reconnecting once if the server closed it.
+
+	Returns:
+		(int, string, string) status, ETag header or None, and body
+	"""
+	def request(self, path, headers):
+		for attempt in xrange(2):
+			connection = getattr(self.local, 'connection', None)
+			if connection is None:
+				connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+				self.local.connection = connection
+			try:
+				connection.request('GET', path, headers=headers)
+				response = connection.getresponse()
+				body = response.read()
+				return response.status, response.getheader('etag'), body
+			except (httplib.HTTPException, socket.error):
+				connection.close()
+				self.local.connection = None
+				if attempt:
+					raise
+
+	def count(self, counter):
+		with self.lock:
+			setattr(self, counter, getattr(self, counter) + 1)
+
+	def cache_path(self, path):
+		key = '%s:%s%s%s' % (self.host, self.port, self.base_path, path)
+		return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest() + '.json')
+
+	def read_cache(self, path):
+		if self.cache_dir is None:
+			return None
+		try:
+			with open(self.cache_path(path)) as cache_file:
+				return json.load(cache_file)
+		except (IOError, ValueError):
+			return None
+
+	def write_cache(self, path, cached):
+		if self.cache_dir is None:
+			return
+		with atomic_file(self.cache_path(path)) as cache_file:
+			json.dump(cached, cache_file)
@@ -0,0 +1,80 @@
+from CatalogLoader import CatalogLoader
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import json
+import shutil
+import tempfile
+import threading
+
+# Stand-in for the course catalog, two classes with two sections each
+catalog = {
+	'/school/CS/1332.json': {'name': '1332', 'credits': '3', 'sections': [{'name': 'A'}, {'name': 'B'}]},
+	'/school/CS/1332/A.json': {'name': 'A', 'meetings': []},
+	'/school/CS/1332/B.json': {'name': 'B', 'meetings': []},
+	'/school/MATH/1502.json': {'name': '1502', 'credits': '4', 'sections': [{'name': 'C1'}, {'name': 'C2'}]},
+	'/school/MATH/1502/C1.json': {'name': 'C1', 'meetings': []},
+	'/school/MATH/1502/C2.json': {'name': 'C2', 'meetings': []}
+}
+
+class CatalogHandler(BaseHTTPRequestHandler):
+	# HTTP/1.1 so connections are kept alive between requests
+	protocol_version = 'HTTP/1.1'
+	connections = set([])
+
+	def do_GET(self):
+		CatalogHandler.connections.add(self.client_address)
+		etag = '"%d"' % hash(json.dumps(catalog[self.path], sort_keys=True))
+		if self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return
+		body = json.dumps(catalog[self.path])
+		self.send_response(200)
+		self.send_header('ETag', etag)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class CatalogServer(ThreadingMixIn, HTTPServer):
+	# Each kept alive connection holds a thread
+	daemon_threads = True
+
+
+def catalog_test():
+	server = CatalogServer(('127.0.0.1', 0), CatalogHandler)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	cache_dir = tempfile.mkdtemp()
+	base_url = 'http://127.0.0.1:%d/school' % server.server_port
+	try:
+		results = []
+
+		# Cold cache, everything is downloaded over at most two connections
+		loader = CatalogLoader(base_url, cache_dir, threads=2)
+		classes = loader.load_classes(['CS 1332', 'MATH 1502'])
+		results.append([(info['school'], info['name'], [section['name'] for section in sections]) for info, sections in classes])
+		results.append((loader.downloads, loader.revalidated, loader.cache_hits, len(CatalogHandler.connections) <= 2))
+
+		# Warm cache, nothing is requested
+		loader = CatalogLoader(base_url, cache_dir, threads=2)
+		loader.load_classes(['CS 1332', 'MATH 1502'])
+		results.append((loader.downloads, loader.revalidated, loader.cache_hits))
+
+		# Expired cache, unchanged responses are revalidated and a changed one is downloaded again
+		catalog['/school/CS/1332/B.json']['meetings'] = [{'monday': True}]
+		loader = CatalogLoader(base_url, cache_dir, ttl=0, threads=2)
+		classes = loader.load_classes(['CS 1332', 'MATH 1502'])
+		results.append((loader.downloads, loader.revalidated, loader.cache_hits, classes[0][1][1]['meetings']))
+		return results
+	finally:
+		server.shutdown()
+		shutil.rmtree(cache_dir)
+
+for result in catalog_test():
+	print result
@@ -0,0 +1,60 @@
+"""
+Saves a compiled problem or schedule service to a binary file and loads it back, so a short-lived process can start
+solving without parsing the catalog json and compiling it again.
+
+A file is a snapshot of the object: a header with the format's name, its version and the length of the body, then
+the body, the object pickled at the highest protocol and compressed with zlib. Sections keep their parsed meetings
+and overlap index, domains their sparse sets and binary constraints their CompatibilityTables, the repeated keys
+of the section dictionaries are what compressing saves the most on. Functions are pickled by name, so a problem
+with a lambda in it cannot be saved, and the modules defining its functions have to be importable where it is
+loaded. Each process loading a file unpickles its own copy.
+Loading a file runs whatever its pickle says to, so only load files from a trusted source, like ones saved by the
+same deployment.
+"""
+
+import cPickle
+import struct
+import zlib
+
+from AtomicFile import atomic_file
+
+MAGIC = 'CSPC'
+# Raised whenever the classes saved or the layout of the file change in a way older files cannot be loaded into
+FORMAT_VERSION = 2
+# Magic, format version and length of the body
+HEADER = struct.Struct('<4sII')
+
+
+"""
+Saves a ConstraintSatisfactionProblem, a ScheduleService or any other picklable object
+"""
+def save_compiled(compiled, path):
+	body = zlib.compress(cPickle.dumps(compiled, cPickle.HIGHEST_PROTOCOL))
+	with atomic_file(path, 'wb') as compiled_file:
+		compiled_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(body)))
+		compiled_file.write(body)
+
+
+"""
+Loads an object saved by save_compiled. The file has to be trusted, see above.
+
+Raises:
+	ValueError if the file is not one, was saved in another version of the format, or is damaged
+"""
+def load_compiled(path):
+	with open(path, 'rb') as compiled_file:
+		contents = compiled_file.read()
+	if len(contents) < HEADER.size:
+		raise ValueError('%s is not a compiled file' % path)
+	magic, version, length = HEADER.unpack_from(contents)
+	if magic != MAGIC:
+		raise ValueError('%s is not a compiled file' % path)
+	if version != FORMAT_VERSION:
+		raise ValueError('%s was saved in version %d of the format, not %d' % (path, version, FORMAT_VERSION))
+	if HEADER.size + length != len(contents):
+		raise ValueError('%s is cut short' % path)
+	try:
+		body = zlib.decompress(buffer(contents, HEADER.size))
+	except zlib.error:
+		raise ValueError('%s is damaged' % path)
+	return cPickle.loads(body)
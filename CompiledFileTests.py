@@ -0,0 +1,48 @@
+from CompiledFile import save_compiled, load_compiled, HEADER
+from ConstraintParser import create_variables, create_problem
+from ScheduleService import ScheduleService, open_service
+from CatalogGenerator import generate_catalog
+from TestHelpers import section_names, generate_requests
+import os
+import shutil
+import tempfile
+
+def compiled_test():
+	catalog = generate_catalog(4, 20, 4)
+	directory = tempfile.mkdtemp()
+	try:
+		results = []
+
+		# A problem with compatibility tables solves the same once loaded
+		path = os.path.join(directory, 'problem.bin')
+		parameters = {'min_hours': 6, 'max_hours': 12}
+		save_compiled(create_problem(create_variables(catalog[:6]), parameters, use_tables=True), path)
+		problem = load_compiled(path)
+		expected = create_problem(create_variables(catalog[:6]), parameters, use_tables=True).solve()
+		results.append((sum(1 for table in problem.tables if table is not None), section_names(problem.solve()) == section_names(expected)))
+
+		# A saved service answers like the one it was saved from, its workers load it from the file
+		requests = generate_requests(3, catalog, 10, 5, 5)
+		service = ScheduleService(catalog, cache_size=0)
+		expected = dict(service.solve_all(requests))
+		path = os.path.join(directory, 'service.bin')
+		service.save(path)
+		opened = open_service(path)
+		results.append((dict(opened.solve_all(requests)) == expected, dict(service.solve_all(requests, processes=2)) == expected))
+
+		# Anything else is refused, down to a body that does not decompress
+		saved = open(path, 'rb').read()
+		for contents in ('', 'not a compiled file', saved[:-1], saved[:HEADER.size] + '\0' * (len(saved) - HEADER.size)):
+			with open(path, 'wb') as compiled_file:
+				compiled_file.write(contents)
+			try:
+				load_compiled(path)
+				results.append(None)
+			except ValueError as error:
+				results.append(str(error).replace(path, 'file'))
+		return results
+	finally:
+		shutil.rmtree(directory)
+
+for result in compiled_test():
+	print result
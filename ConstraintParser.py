@@ -1,7 +1,7 @@
 from ConstraintSolver import *
 from SchedulingConstraints import *
-import urllib2
-import json
+from ParallelSolver import solve_parallel
+from CatalogLoader import CatalogLoader
 
 """
 Creates and returns a schedule with the specified parameters or None if no schedule exists.
@@ -10,53 +10,154 @@ Arguments:
 	classes_considered (List<string>) names of classes that can be put into this schedule
 	parameters (dict<string, ?>) mapping of constraint types to values for those constraints
 		Options - max_hours, min_hours, day_start, day_end, classes_needed
+		Preferences - minimize_gaps, prefer_start, minimize_days, preferred_professors
 	class_variables (List<Variable>) override for getting classes from web, testing purposes
+	use_tables (boolean) check overlaps with pairwise constraints and precomputed compatibility tables
+		instead of one global constraint, see ConstraintSatisfactionProblem
+	processes (int) solve on a pool of this many worker processes, see ParallelSolver
+	catalog_loader (CatalogLoader) override for where and how class data is fetched and cached
+	deadline (number) time.time() at which to give up, returning a Timeout instead of a schedule
+	node_limit (int) most search nodes to expand before giving up, cannot be given with processes
+	cancel (threading.Event) gives up once set
+	solution_cache (SolutionCache) answers a problem asked before without a search, and keeps the result of this one
 
 Option Details:
 	max_hours, min_hours (int) number of hours, inclusive
 	day_start, day_end (string) should be in the format '2000-01-01T%H:%M:%SZ') to match course info
 	classes_needed (List<string>) each class should be in the format '[school] [number]', ex. 'CS 1332'
+
+Preference Details:
+	When any preference is given the schedule with the lowest total cost is returned
+	minimize_gaps (number) cost of each minute between classes on the same day
+	prefer_start (string) same format as day_start, costs each minute the first class of a day is earlier
+	minimize_days (number) cost of each day with a class
+	preferred_professors (List<string>) each class with another professor costs 60
 """
-def create_schedule(classes_considered, parameters, class_variables = None):
-	variables = []
+def create_schedule(classes_considered, parameters, class_variables = None, use_tables = False, processes = None, catalog_loader = None,
+		deadline = None, node_limit = None, cancel = None, solution_cache = None):
+	# Checked before fetching anything, a cached result would not reach solve_problem to check it
+	check_budget(processes, node_limit)
 	if class_variables is None:
 		# Define variables through web
-		for class_name in (name.split(' ') for name in classes_considered):
-			print 'Getting class data for %s %s' % (class_name[0], class_name[1])
-			class_info = json.load(urllib2.urlopen('http://course.us.to/school/%s/%s.json' % (class_name[0], class_name[1])))
-			# Doesn't store school properly in json, fix
-			class_info['school'] = class_name[0]
-			sections = []
-			for section_name in (section['name'] for section in class_info['sections']):
-				sections.append(json.load(urllib2.urlopen('http://course.us.to/school/%s/%s/%s.json' % (class_name[0], class_name[1], section_name))))
-			sections.append(None)
-			variables.append(Variable(class_info, sections))
+		print 'Getting class data for %s' % ', '.join(classes_considered)
+		loader = catalog_loader if catalog_loader is not None else CatalogLoader()
+		variables = create_variables(loader.load_classes(classes_considered))
 	else:
 		# Use for testing
 		variables = class_variables
 
 	print 'Creating constraint list'
-	constraints = []
-	for ptype in parameters:
-		if ptype == 'max_hours':
-			constraints.append(Constraint(variables, max_hours_constraint, max_hours=parameters[ptype]))
-		if ptype == 'min_hours':
-			constraints.append(Constraint(variables, min_hours_constraint, min_hours=parameters[ptype]))
-		if ptype == 'day_start':
-			for constraint in create_day_start_constraints(parameters[ptype], variables):
-				constraints.append(constraint)
-		if ptype == 'day_end':
-			for constraint in create_day_end_constraints(parameters[ptype], variables):
-				constraints.append(constraint)
-		if ptype == 'classes_needed':
-			for constraint in create_class_needed_constraints(variables, parameters[ptype]):
-				constraints.append(constraint)
-	for constraint in create_no_overlap_constraints(variables):
-		constraints.append(constraint)
+	problem = create_problem(variables, parameters, use_tables)
 
 	print 'Solving constraint satisfaction problem'
-	problem = ConstraintSatisfactionProblem(variables, constraints)
-	return problem.solve()
+	if solution_cache is not None:
+		return solution_cache.solve(problem, lambda: solve_problem(problem, processes, deadline, node_limit, cancel))
+	return solve_problem(problem, processes, deadline, node_limit, cancel)
+
+"""
+Solves a problem from create_problem, see create_schedule for the arguments
+
+Raises:
+	ValueError if both processes and node_limit are given
+"""
+def solve_problem(problem, processes = None, deadline = None, node_limit = None, cancel = None):
+	check_budget(processes, node_limit)
+	if processes is not None:
+		result = solve_parallel(problem, processes, deadline=deadline, cancel=cancel)
+		if not problem.soft_constraints:
+			return result
+		if isinstance(result, Timeout):
+			return Timeout(result.reason, result.partial[0][1] if result.partial else None, result.statistics)
+		return result[0][1] if result else None
+	return problem.solve(deadline, node_limit, cancel)
+
+"""
+Refuses a node limit for a search on a pool of processes, the workers search apart and only a deadline or
+cancelling stops them all
+"""
+def check_budget(processes, node_limit):
+	if processes is not None and node_limit is not None:
+		raise ValueError('node_limit cannot be given with processes, use a deadline instead')
+
+"""
+Creates a variable for each class, its sections and None for not taking it are the domain.
+
+Arguments:
+	classes (List<(dict, List<dict>)>) class info and sections, as given by CatalogLoader.load_classes
+"""
+def create_variables(classes):
+	variables = []
+	for class_info, sections in classes:
+		variables.append(Variable(class_info, list(sections) + [None]))
+	return variables
+
+"""
+Creates the problem for a schedule without solving it, see create_schedule for the other arguments.
+Sections outside day_start and day_end are taken out of the domains with one mask over every section, instead of
+a unary constraint on each class.
+
+Arguments:
+	columns (SectionColumns) optional, columns holding every section of the variables, like the catalog's from
+		compile_catalog, so their masks are kept from one problem to the next
+"""
+def create_problem(variables, parameters, use_tables = False, columns = None):
+	# Parse meeting times once up front instead of on every constraint check
+	compile_sections(variables)
+	if 'day_start' in parameters or 'day_end' in parameters:
+		if columns is None:
+			columns = SectionColumns([(variable.data, [section for section in variable.domain if section is not None])
+				for variable in variables])
+		columns.remove_outside_window(variables, parameters.get('day_start'), parameters.get('day_end'))
+
+	constraints = []
+	soft_constraints = []
+	for ptype in (ptype for ptype in parameter_types(parameters) if ptype not in ('day_start', 'day_end')):
+		hard, soft = create_parameter_constraints(ptype, parameters, variables, use_tables)
+		constraints += hard
+		soft_constraints += soft
+	return ConstraintSatisfactionProblem(variables, constraints, use_tables, soft_constraints=soft_constraints)
+
+"""
+Lists the groups of constraints a schedule with the given parameters has. min_hours and max_hours make one group,
+'hours', and 'no_overlap' is the group keeping classes apart that every schedule has.
+"""
+def parameter_types(parameters):
+	ptypes = []
+	if 'max_hours' in parameters or 'min_hours' in parameters:
+		ptypes.append('hours')
+	ptypes += [ptype for ptype in parameters if ptype in ('day_start', 'day_end', 'classes_needed')]
+	ptypes.append('no_overlap')
+	ptypes += [ptype for ptype in parameters if ptype in ('minimize_gaps', 'prefer_start', 'minimize_days', 'preferred_professors')]
+	return ptypes
+
+"""
+Creates the constraints for one group from parameter_types.
+
+Returns:
+	(List<Constraint>, List<SoftConstraint>)
+"""
+def create_parameter_constraints(ptype, parameters, variables, use_tables = False):
+	if ptype == 'hours':
+		return create_credit_hours_constraints(variables, parameters.get('min_hours'), parameters.get('max_hours')), []
+	if ptype == 'day_start':
+		return create_day_start_constraints(parameters[ptype], variables), []
+	if ptype == 'day_end':
+		return create_day_end_constraints(parameters[ptype], variables), []
+	if ptype == 'classes_needed':
+		return create_class_needed_constraints(variables, parameters[ptype]), []
+	if ptype == 'no_overlap':
+		if use_tables:
+			return create_pairwise_no_overlap_constraints(variables), []
+		return create_no_overlap_constraints(variables), []
+	if ptype == 'minimize_gaps':
+		return [], create_idle_gap_constraints(variables, parameters[ptype])
+	if ptype == 'prefer_start':
+		return [], create_late_start_constraints(parameters[ptype], variables)
+	if ptype == 'minimize_days':
+		return [], create_campus_days_constraints(variables, parameters[ptype])
+	if ptype == 'preferred_professors':
+		return [], create_professor_preference_constraints(parameters[ptype], variables)
+	return [], []
 
 def create_class_needed_constraints(variables, classes_needed):
 	constraints = []
@@ -1,23 +1,90 @@
-from collections import deque
+from array import array
+from collections import deque, OrderedDict
+import heapq
+import random
+import time
+
+"""
+	Class of the UNASSIGNED placeholder, pickles by name so it stays the same object in other processes
+"""
+class Unassigned(object):
+	def __reduce__(self):
+		return 'UNASSIGNED'
+
+	def __repr__(self):
+		return 'UNASSIGNED'
+
+# Value given to positional test functions for a variable that has no value yet
+UNASSIGNED = Unassigned()
+
+# Most assignments in a nogood worth keeping, see NogoodStore
+MAX_NOGOOD_SIZE = 8
+
+# Nodes in a search between restarts, times the next term of the Luby sequence
+RESTART_SCALE = 100
+
+"""
+Marks a test_satisfied function as positional. Instead of a map of variables to values it takes in a list with
+the value of each variable in the constraint's order, UNASSIGNED for variables without one. Saves building a
+dictionary for every check.
+"""
+def positional(test_satisfied):
+	test_satisfied.positional = True
+	return test_satisfied
+
+"""
+Marks a test_satisfied or cost function as symmetric, it gives the same result however its variables are ordered.
+Lets SolutionCache match a constraint given its variables in another order.
+"""
+def symmetric(function):
+	function.symmetric = True
+	return function
 
 """
 	Class to represent a constraint. Tracks the variables involved.
 	Can determine whether a map of variables to values satisfies this constraint.
 """
-class Constraint:
+class Constraint(object):
+	# Constraints, domains and variables are touched on every node of the search, slots keep their attribute lookups
+	# fast. The search keeps what it needs about them in lists by their ids instead of dictionaries keyed by them
+	__slots__ = ('variables', 'test_satisfied', 'propagate', 'propagates', 'entailed', 'links', 'extras', 'scope',
+		'positional', 'values', 'value_map', 'checks', 'index')
+
 	"""
 	Args:
 		variables (list<Variable>): all variables involved in this constraint
-		test_satisfied (function): a function that declares the constraint satisfied or not, takes in a  map of variables to values
+		test_satisfied (function): a function that declares the constraint satisfied or not, takes in a  map of variables to values,
+			or a list of values if it is marked positional
+		propagate (function): optional, for constraints on more than two variables. Takes in the variables and extras,
+			returns a list of (variable, value, culprits) for values of unassigned variables that cannot be part of a
+			solution given the assigned values and the other domains. culprits are the variables the removal depends on
+		entailed (function): optional, for constraints on more than two variables. Takes in the variables and extras,
+			returns True if every combination of the values left in their domains satisfies the constraint
+		links (function): optional, for constraints on more than two variables that hold whenever they hold for every
+			pair of their variables, like no two classes overlapping. Takes in the variables and extras, returns the
+			pairs of variables with values left in their domains that can break the constraint together
 		**extras: any extra information that should be given to the test_satisfies function
 	"""
-	def __init__(self, variables, test_satisfied, **extras):
+	def __init__(self, variables, test_satisfied, propagate=None, entailed=None, links=None, **extras):
 		self.variables = variables
 		self.test_satisfied = test_satisfied
+		self.propagate = propagate
+		self.propagates = propagate is not None
+		self.entailed = entailed
+		self.links = links
 		self.extras = extras
+		# Position of each variable, and a list or map reused for every check instead of building one
+		self.scope = dict((variable, position) for position, variable in enumerate(self.variables))
+		self.positional = getattr(test_satisfied, 'positional', False)
+		self.values = [UNASSIGNED] * len(self.variables)
+		self.value_map = {}
+		# Number of times the test function has been called
+		self.checks = 0
+		# Id in the problem the constraint is in, see ConstraintSatisfactionProblem.assign_ids
+		self.index = -1
 		for variable in self.variables:
 			variable.add_constraint(self)
-	
+
 	"""
 	Determines whether this constraint is satisfied by the given assignment
 
@@ -28,19 +95,333 @@ class Constraint:
 		True if the constraint is satisfied with these values, false otherwise
 	"""
 	def is_satisfied(self, value_map):
-		remove_variables = []
+		self.checks += 1
+		if self.positional:
+			values = self.values
+			for position in xrange(len(values)):
+				values[position] = value_map.get(self.variables[position], UNASSIGNED)
+			return self.test_satisfied(self.variables, values, self.extras)
 		for variable in value_map:
-			if variable not in self.variables:
-				remove_variables.append(variable)
-		for variable in remove_variables:
-			del value_map[variable]
+			if variable not in self.scope:
+				value_map = dict((variable, value_map[variable]) for variable in value_map if variable in self.scope)
+				break
+		return self.test_satisfied(self.variables, value_map, self.extras)
+
+	"""
+	Determines whether a constraint on one variable is satisfied by value
+	"""
+	def check_unary(self, value):
+		self.checks += 1
+		if self.positional:
+			values = self.values
+			values[0] = value
+			return self.test_satisfied(self.variables, values, self.extras)
+		value_map = self.value_map
+		value_map.clear()
+		value_map[self.variables[0]] = value
+		return self.test_satisfied(self.variables, value_map, self.extras)
+
+	"""
+	Determines whether a constraint on two variables is satisfied by first and second, in the order of variables
+	"""
+	def check_binary(self, first, second):
+		self.checks += 1
+		if self.positional:
+			values = self.values
+			values[0] = first
+			values[1] = second
+			return self.test_satisfied(self.variables, values, self.extras)
+		value_map = self.value_map
+		value_map.clear()
+		value_map[self.variables[0]] = first
+		value_map[self.variables[1]] = second
 		return self.test_satisfied(self.variables, value_map, self.extras)
 
+	"""
+	Determines whether this constraint is satisfied with variable set to value and the other variables at their
+	assigned values, unassigned ones are left out
+	"""
+	def check_assigned(self, variable, value):
+		self.checks += 1
+		variables = self.variables
+		if self.positional:
+			values = self.values
+			for position in xrange(len(variables)):
+				other = variables[position]
+				values[position] = other.value if other.assigned else UNASSIGNED
+			values[self.scope[variable]] = value
+			return self.test_satisfied(variables, values, self.extras)
+		value_map = self.value_map
+		value_map.clear()
+		for other in variables:
+			if other.assigned:
+				value_map[other] = other.value
+		value_map[variable] = value
+		return self.test_satisfied(variables, value_map, self.extras)
+
+	"""
+	Finds the values this constraint rules out, for constraints that propagate
+
+	Returns:
+		list<(Variable, ?, list<Variable>)> see propagate
+	"""
+	def find_removals(self):
+		return self.propagate(self.variables, self.extras)
+
+	"""
+	Determines whether the values left in the domains can only satisfy this constraint, so the search need not
+	check it. Constraints on more than two variables are never entailed without an entailed function.
+	"""
+	def is_entailed(self):
+		return self.entailed is not None and self.entailed(self.variables, self.extras)
+
+	"""
+	Finds the pairs of variables whose values left can break this constraint together, see links
+
+	Returns:
+		list<(Variable, Variable)>, or None if the constraint has no links function and any of its variables can
+		break it together
+	"""
+	def find_links(self):
+		if self.links is None:
+			return None
+		return self.links(self.variables, self.extras)
+
+
+"""
+	Class to represent a constraint that the weights of the values assigned to its variables add up to a total between
+	a minimum and maximum. The total of the assigned variables is kept as they are assigned, together with the
+	smallest and largest weight left in each unassigned domain it bounds the final total, and values that would
+	push it out of range are pruned before search reaches them.
+"""
+class LinearSumConstraint(Constraint):
+	__slots__ = ('minimum', 'maximum', 'weights', 'total')
+
+	"""
+	Args:
+		variables (list<Variable>): all variables involved in this constraint
+		weight (function): gives the weight of a value, takes in a variable and a value
+		minimum (number): smallest allowed total, None for no limit
+		maximum (number): largest allowed total, None for no limit
+		**extras: any extra information that should be given to the test function
+	"""
+	def __init__(self, variables, weight, minimum=None, maximum=None, **extras):
+		Constraint.__init__(self, variables, linear_sum_satisfied, weight=weight, minimum=minimum, maximum=maximum, **extras)
+		self.propagates = True
+		self.minimum = minimum
+		self.maximum = maximum
+		# Weights of each variable's values by value index
+		self.weights = dict((variable, [weight(variable, value) for value in variable.domain.values]) for variable in variables)
+		self.recount()
+
+	"""
+	Sets the total from the variables assigned now, for when it was not kept up to date as they were assigned
+	"""
+	def recount(self):
+		self.total = 0
+		for variable in (var for var in self.variables if var.assigned):
+			self.total += self.weights[variable][variable.domain.index(variable.value)]
+
+	"""
+	Entailed once the smallest and largest totals the domains allow are both in range
+	"""
+	def is_entailed(self):
+		lower = upper = self.total
+		for variable in (var for var in self.variables if not var.assigned):
+			weights = self.weights[variable]
+			live = [weights[index] for index in variable.domain.live_indices()]
+			if not live:
+				# No total can be reached, the search fails on the empty domain
+				return False
+			lower += min(live)
+			upper += max(live)
+		return (self.minimum is None or lower >= self.minimum) and (self.maximum is None or upper <= self.maximum)
+
+	def find_removals(self):
+		lower = upper = self.total
+		ranges = []
+		for variable in (var for var in self.variables if not var.assigned):
+			weights = self.weights[variable]
+			live = [weights[index] for index in variable.domain.live_indices()]
+			if not live:
+				return []
+			low = min(live)
+			high = max(live)
+			lower += low
+			upper += high
+			ranges.append((variable, low, high))
+
+		removals = []
+		for variable, low, high in ranges:
+			# The range this variable's weight can take when every other variable does its best
+			most = None if self.maximum is None else self.maximum - (lower - low)
+			least = None if self.minimum is None else self.minimum - (upper - high)
+			if (most is not None and high > most) or (least is not None and low < least):
+				culprits = [other for other in self.variables if other is not variable]
+				weights = self.weights[variable]
+				for index in variable.domain.live_indices():
+					if (most is not None and weights[index] > most) or (least is not None and weights[index] < least):
+						removals.append((variable, variable.domain.values[index], culprits))
+		return removals
+
+
+"""
+Tests a LinearSumConstraint once all of its variables are assigned, propagation keeps partial totals in range.
+"""
+@positional
+@symmetric
+def linear_sum_satisfied(variables, values, extras):
+	if UNASSIGNED in values:
+		return True
+	weight = extras['weight']
+	total = 0
+	for position in xrange(len(variables)):
+		total += weight(variables[position], values[position])
+	if extras['minimum'] is not None and total < extras['minimum']:
+		return False
+	if extras['maximum'] is not None and total > extras['maximum']:
+		return False
+	return True
+
+
+"""
+	Class to represent a soft constraint, a preference that adds a cost to an assignment instead of ruling it out.
+	Can give a lower bound on its cost from the assigned values and the domains of the unassigned variables.
+"""
+class SoftConstraint(object):
+	__slots__ = ('variables', 'cost', 'bound', 'weight', 'extras')
+
+	"""
+	Args:
+		variables (list<Variable>): all variables involved in this constraint
+		cost (function): gives the cost of a map of variables to values, takes the same arguments as a test_satisfied function
+		lower_bound (function): optional, gives a bound no greater than the cost of any completion of a map of the
+			assigned variables to values, unassigned variables can be read from the variables list
+		weight (number): multiplier for the cost
+		**extras: any extra information that should be given to the cost and lower_bound functions
+	"""
+	def __init__(self, variables, cost, lower_bound=None, weight=1, **extras):
+		self.variables = variables
+		self.cost = cost
+		self.bound = lower_bound
+		self.weight = weight
+		self.extras = extras
+
+	"""
+	Determines a lower bound on the weighted cost of this constraint given the current assignment,
+	exact once every variable is assigned
+
+	Returns:
+		number
+	"""
+	def lower_bound(self):
+		value_map = {}
+		unassigned = None
+		for variable in self.variables:
+			if variable.assigned:
+				value_map[variable] = variable.value
+			elif unassigned is None:
+				unassigned = variable
+			else:
+				# Two or more unassigned, fall back to the given bound
+				if self.bound is None:
+					return 0
+				return self.weight * self.bound(self.variables, value_map, self.extras)
+		if unassigned is None:
+			return self.weight * self.cost(self.variables, value_map, self.extras)
+		# One unassigned, the best value in its domain gives the exact bound
+		best = None
+		for value in unassigned.domain:
+			value_map[unassigned] = value
+			cost = self.cost(self.variables, value_map, self.extras)
+			if best is None or cost < best:
+				best = cost
+		return 0 if best is None else self.weight * best
+
+
+"""
+	Class to represent the domain of a variable as a sparse set over the indices of its initial values.
+	The live values are dense[:size], removed values are kept after them in the order they were removed,
+	so the most recent removal can be undone by moving the size pointer back.
+	Values are looked up by identity, so they do not need to be hashable.
+"""
+class Domain(object):
+	__slots__ = ('values', 'indices', 'dense', 'positions', 'size', 'mask')
+
+	"""
+	Args:
+		values (iterable<?>): every value the variable can initially be assigned
+	"""
+	def __init__(self, values):
+		self.values = list(values)
+		self.indices = dict((id(value), index) for index, value in enumerate(self.values))
+		self.dense = range(len(self.values))
+		self.positions = range(len(self.values))
+		self.size = len(self.values)
+		# Bitset of the live indices, kept in step with dense for the compatibility tables
+		self.mask = (1 << self.size) - 1
+
+	def index(self, value):
+		return self.indices[id(value)]
+
+	def live_indices(self):
+		return self.dense[:self.size]
+
+	"""
+	Removes a live value from the domain. It is swapped to just past the live values.
+	"""
+	def remove(self, value):
+		index = self.indices[id(value)]
+		position = self.positions[index]
+		self.size -= 1
+		last = self.dense[self.size]
+		self.dense[position] = last
+		self.positions[last] = position
+		self.dense[self.size] = index
+		self.positions[index] = self.size
+		self.mask &= ~(1 << index)
+
+	"""
+	Puts back the most recently removed value.
+	"""
+	def restore_last(self):
+		self.mask |= 1 << self.dense[self.size]
+		self.size += 1
+
+	# The index lookup is keyed by identity, which does not survive pickling, so it is rebuilt on load
+	def __getstate__(self):
+		return self.values, self.dense, self.positions, self.size, self.mask
+
+	def __setstate__(self, state):
+		self.values, self.dense, self.positions, self.size, self.mask = state
+		self.indices = dict((id(value), index) for index, value in enumerate(self.values))
+
+	def __len__(self):
+		return self.size
+
+	def __iter__(self):
+		values = self.values
+		dense = self.dense
+		for position in xrange(self.size):
+			yield values[dense[position]]
+
+	def __contains__(self, value):
+		index = self.indices.get(id(value))
+		return index is not None and self.positions[index] < self.size
+
+	def __str__(self):
+		return str(list(self))
+
+	def __repr__(self):
+		return repr(list(self))
+
 
 """
 	Class to represent a variable. Has data, value, relevant constraints, conlfict set, and a domain.
 """
-class Variable:
+class Variable(object):
+	__slots__ = ('data', 'domain', 'constraints', 'conflict_set', 'value', 'assigned', 'index')
+
 	"""
 	Args:
 		data (?): the data for this variable
@@ -48,11 +429,13 @@ class Variable:
 	"""
 	def __init__(self, data, domain):
 		self.data = data
-		self.domain = domain
+		self.domain = domain if isinstance(domain, Domain) else Domain(domain)
 		self.constraints = []
 		self.conflict_set = set([])
 		self.value = None
 		self.assigned = False
+		# Id in the problem the variable is in, see ConstraintSatisfactionProblem.assign_ids
+		self.index = -1
 
 	"""
 	Adds a constraint to the list of relevant constraints for this variable
@@ -86,9 +469,260 @@ class Variable:
 		return str(self.data)
 
 
-class ConstraintSatisfactionProblem:
-	def __init__(self, variables, constraints):
+"""
+	Class to store the result of testing a binary constraint on every pair of values in its variables' domains.
+	rows[side][index] is a bitset of the indices of the other variable's values compatible with the value at index of
+	the constraint's first variable for side 0, or its second for side 1.
+"""
+class CompatibilityTable(object):
+	__slots__ = ('first', 'rows')
+
+	"""
+	Args:
+		constraint (Constraint): a binary constraint
+	"""
+	def __init__(self, constraint):
+		first, second = constraint.variables
+		self.first = first
+		self.rows = ([0] * len(first.domain.values), [0] * len(second.domain.values))
+		for index1, value1 in enumerate(first.domain.values):
+			for index2, value2 in enumerate(second.domain.values):
+				if constraint.check_binary(value1, value2):
+					self.rows[0][index1] |= 1 << index2
+					self.rows[1][index2] |= 1 << index1
+
+	"""
+	Returns the bitset of the other variable's values that are compatible with variable set to value
+	"""
+	def row(self, variable, value):
+		return self.rows[0 if variable is self.first else 1][variable.domain.index(value)]
+
+	"""
+	Looks up whether the constraint is satisfied with variable set to value and other set to other_value
+	"""
+	def is_satisfied(self, variable, value, other, other_value):
+		return (self.row(variable, value) >> other.domain.index(other_value)) & 1 == 1
+
+
+def count_bits(mask):
+	return bin(mask).count('1')
+
+
+"""
+Gives what was kept for each item in a list by the ids of previous, in the order of items, once they are numbered
+again. Items that were not in previous get default.
+"""
+def carry_over(items, previous, values, default):
+	kept = []
+	for item in items:
+		index = item.index
+		kept.append(values[index] if 0 <= index < len(previous) and previous[index] is item else default)
+	return kept
+
+
+"""
+	Class to remember nogoods, partial assignments a search found cannot be extended to a solution.
+	A nogood is a set of (variable id, value index) pairs, and is listed under every pair in it, so the nogoods an
+	assignment could complete are found without looking at the rest. Holds a bounded number, dropping the least
+	recently used. Assignments are read from a problem's assignment list, see ConstraintSatisfactionProblem.assign.
+"""
+class NogoodStore(object):
+	"""
+	Args:
+		capacity (int): most nogoods kept
+		max_size (int): most assignments in a kept nogood, longer ones are rarely met again
+	"""
+	def __init__(self, capacity, max_size=MAX_NOGOOD_SIZE):
+		self.capacity = capacity
+		self.max_size = max_size
+		# Sets of (variable id, value index) pairs, least recently used first
+		self.nogoods = OrderedDict()
+		self.watches = {}
+
+	def __len__(self):
+		return len(self.nogoods)
+
+	"""
+	Records the current values of some assigned variables as a nogood
+
+	Args:
+		variables (iterable<Variable>): assigned variables
+		assignment (list<int>): the value index of each variable by id
+	Returns:
+		True if it was kept
+	"""
+	def add(self, variables, assignment):
+		if not 0 < len(variables) <= self.max_size or self.capacity <= 0:
+			return False
+		nogood = frozenset((variable.index, assignment[variable.index]) for variable in variables)
+		if nogood in self.nogoods:
+			return False
+		if len(self.nogoods) >= self.capacity:
+			evicted = self.nogoods.popitem(False)[0]
+			for pair in evicted:
+				watches = self.watches[pair]
+				watches.remove(evicted)
+				if not watches:
+					del self.watches[pair]
+		self.nogoods[nogood] = True
+		for pair in nogood:
+			self.watches.setdefault(pair, []).append(nogood)
+		return True
+
+	"""
+	Finds a nogood that assigning the value at index to a variable would complete
+
+	Args:
+		variable (int): the variable's id
+		index (int): the value's index
+		assignment (list<int>): the value index of each variable by id, -1 for unassigned
+	Returns:
+		list<int> the ids of the other variables in the nogood, or None if there is none
+	"""
+	def find(self, variable, index, assignment):
+		watches = self.watches.get((variable, index))
+		if watches is None:
+			return None
+		for nogood in watches:
+			for other, other_index in nogood:
+				if other != variable and assignment[other] != other_index:
+					break
+			else:
+				del self.nogoods[nogood]
+				self.nogoods[nogood] = True
+				return [other for other, other_index in nogood if other != variable]
+		return None
+
+	def clear(self):
+		self.nogoods.clear()
+		self.watches.clear()
+
+
+"""
+Gives the index-th term of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..., counting from 1
+"""
+def luby(index):
+	size = 1
+	while size < index:
+		size = 2 * size + 1
+	if size == index:
+		return (size + 1) / 2
+	return luby(index - size / 2)
+
+
+"""
+	Raised by check_limits when a search with restarts has used up the nodes of its current run
+"""
+class Restart(Exception):
+	pass
+
+
+"""
+	Raised inside a search when its deadline or node limit is reached or it is cancelled, see
+	ConstraintSatisfactionProblem.set_limits. iter_solutions lets it through to the caller.
+"""
+class BudgetExceeded(Exception):
+	"""
+	Args:
+		reason (string): 'deadline', 'node_limit' or 'cancelled'
+	"""
+	def __init__(self, reason):
+		Exception.__init__(self, reason)
+		self.reason = reason
+
+
+"""
+	Class of the result of a search that stopped before it finished. Unlike None it does not mean there is
+	no solution, but it is false like None so callers that only check for a solution treat it as none found.
+"""
+class Timeout(object):
+	"""
+	Args:
+		reason (string): 'deadline', 'node_limit' or 'cancelled'
+		partial (?): what the search had found, the values assigned when it stopped for solve, or the best
+			assignment so far when solve is optimizing, the best list so far for optimize, the count for count_solutions
+		statistics (SolverStatistics): the counters when the search stopped
+	"""
+	def __init__(self, reason, partial, statistics):
+		self.reason = reason
+		self.partial = partial
+		self.statistics = statistics
+
+	def __nonzero__(self):
+		return False
+
+	def __repr__(self):
+		return 'Timeout(%s)' % self.reason
+
+
+"""
+	Class to hold a snapshot of a problem's search counters, see ConstraintSatisfactionProblem.statistics.
+	checks maps the name of each constraint's test function to the number of times it was called.
+"""
+class SolverStatistics(object):
+	"""
+	Args:
+		problem (ConstraintSatisfactionProblem): the problem to take the counters of
+	"""
+	def __init__(self, problem):
+		self.nodes = problem.nodes
+		self.backtracks = problem.backtracks
+		self.backjumps = problem.backjumps
+		self.solutions_found = problem.solutions_found
+		self.learned = problem.learned
+		self.nogood_skips = problem.nogood_skips
+		self.restarts = problem.restart_count
+		self.entailed = len(problem.entailed)
+		self.components = problem.components
+		self.revisions = problem.revisions
+		self.propagations = problem.propagations
+		self.pruned = problem.pruned
+		self.times = dict(problem.times)
+		self.checks = {}
+		for constraint in problem.unary_constraints + problem.binary_constraints + problem.nary_constraints:
+			name = constraint.test_satisfied.__name__
+			self.checks[name] = self.checks.get(name, 0) + constraint.checks
+
+	def total_checks(self):
+		return sum(self.checks.values())
+
+	def __str__(self):
+		lines = [
+			'nodes %d, backtracks %d, backjumps %d, solutions %d, restarts %d' % (self.nodes, self.backtracks, self.backjumps,
+				self.solutions_found, self.restarts),
+			'nogoods learned %d, values skipped by nogoods %d' % (self.learned, self.nogood_skips),
+			'constraints entailed %d, components %d' % (self.entailed, self.components),
+			'revisions %d, propagations %d, values pruned %d' % (self.revisions, self.propagations, self.pruned),
+			'time %s' % ', '.join('%s %.3fs' % (phase, self.times[phase]) for phase in ('remove_unary', 'make_inferences', 'search'))
+		]
+		for name in sorted(self.checks):
+			lines.append('checks %s %d' % (name, self.checks[name]))
+		return '\n'.join(lines)
+
+
+class ConstraintSatisfactionProblem(object):
+	"""
+	Args:
+		variables (list<Variable>): all variables in the problem
+		constraints (list<Constraint>): all constraints in the problem
+		use_tables (boolean): evaluate every binary constraint once over its domains up front and answer
+			later checks from a CompatibilityTable instead of calling the constraint again
+		backjumping (boolean): use conflict-directed backjumping instead of chronological backtracking
+		soft_constraints (list<SoftConstraint>): preferences to minimize, solve returns the cheapest assignment if given
+		trace (function): optional, called as trace(event, variable, value) at each search decision. Events are
+			'assign' and 'unassign' for a value tried and taken back, 'backjump' for a variable skipped over,
+			and 'solution' and 'restart' with variable and value None. solve and count_solutions search each
+			component from find_components on its own, 'solution' is given when one is complete
+		nogood_limit (int): most nogoods backjumping search remembers, 0 to remember none, see NogoodStore
+		restarts (boolean): have solve start its search over after a growing number of nodes, choosing variables
+			by domain size over weighted degree, see restart_search. Keeps one unlucky early choice from
+			holding up the whole search
+		seed (int): seeds the random tie breaking between variables after a restart
+	"""
+	def __init__(self, variables, constraints, use_tables=False, backjumping=True, soft_constraints=(), trace=None,
+			nogood_limit=1000, restarts=False, seed=0):
 		self.variables = variables
+		self.soft_constraints = list(soft_constraints)
 		self.unary_constraints = []
 		self.binary_constraints = []
 		self.nary_constraints = []
@@ -100,6 +734,122 @@ class ConstraintSatisfactionProblem:
 			else:
 				self.nary_constraints.append(constraint)
 
+		# Variables that had a value removed, or (variable, culprit) pairs added to a conflict set, undone newest first
+		self.trail = []
+
+		self.backjumping = backjumping
+		for variable in self.variables:
+			variable.conflict_set = set([])
+		# Domain wiped out by the last failed make_inferences
+		self.wiped_out = None
+		# Conflict sets found by backtracking_search, each one's values cannot be part of a solution together.
+		# They only depend on the constraints, so they are kept from one search to the next
+		self.nogoods = NogoodStore(nogood_limit)
+
+		# Search counters, nodes are calls to backtracking_search, backjumps are levels skipped over
+		self.nodes = 0
+		self.backtracks = 0
+		self.backjumps = 0
+		self.solutions_found = 0
+		# Nogoods recorded, and values skipped because they would complete one
+		self.learned = 0
+		self.nogood_skips = 0
+		self.restart_count = 0
+		# Calls to remove_inconsistent_values and run_propagator, and values removed from domains
+		self.revisions = 0
+		self.propagations = 0
+		self.pruned = 0
+		# Seconds spent in each phase, see preprocess, solve and optimize
+		self.times = {'remove_unary': 0.0, 'make_inferences': 0.0, 'search': 0.0}
+		self.trace = trace
+		self.restarts = restarts
+		self.random = random.Random(seed)
+		# Node count at which the current run of restart_search ends
+		self.restart_at = None
+		self.set_limits()
+		# Value to try first for each variable, see order_domain_values
+		self.hints = {}
+
+		# Constraints the current search left out, and each variable's constraints before they were, see remove_entailed
+		self.entailed = []
+		self.detached = {}
+		# Number of components the last search split into, the variables it is searching now and a set of them, see
+		# search_component
+		self.components = 0
+		self.searched = self.variables
+		self.members = None
+
+		self.selection_heap = []
+		# What the search keeps for each variable and constraint is in lists by their ids, see assign_ids.
+		# Weight of each constraint, one more for every domain it wiped out, and of variables wiped out by constraints
+		# on more than two variables, see bump_weight
+		self.constraints = []
+		self.numbered = []
+		self.weights = []
+		self.variable_weights = []
+		# CompatibilityTable of each constraint that has one, and the supports found for the values of each side of each
+		# binary constraint, see remove_inconsistent_values
+		self.tables = []
+		self.residues = []
+		self.assign_ids()
+		if use_tables:
+			for constraint in self.binary_constraints:
+				self.tables[constraint.index] = CompatibilityTable(constraint)
+		self.index_variables()
+
+	"""
+	Numbers the variables and constraints by their positions in the problem, the ids the lists the search keeps are
+	indexed by. Called again whenever variables or constraints are added or removed, the weights and tables of the
+	ones left are kept. A variable or constraint has the id the last problem to number it gave it, so it can only be
+	searched in one problem at a time.
+	"""
+	def assign_ids(self):
+		constraints = self.unary_constraints + self.binary_constraints + self.nary_constraints
+		self.weights = carry_over(constraints, self.constraints, self.weights, 1)
+		self.tables = carry_over(constraints, self.constraints, self.tables, None)
+		self.variable_weights = carry_over(self.variables, self.numbered, self.variable_weights, 0)
+		# Supports are found again, they are only a place to start looking
+		self.residues = [None] * (2 * len(constraints))
+		for index, constraint in enumerate(constraints):
+			constraint.index = index
+		for index, variable in enumerate(self.variables):
+			variable.index = index
+		self.constraints = constraints
+		self.numbered = list(self.variables)
+
+	"""
+	Builds the bookkeeping for select_unassigned_variable, kept up to date as variables are assigned and pruned,
+	and the flat adjacency of the constraints left on each variable. Called again whenever variables or constraints
+	change, or constraints are taken off their variables.
+	"""
+	def index_variables(self):
+		variables = self.variables
+		# Tie breaking order of each variable by id, see restart_search
+		self.positions = range(len(variables))
+		# Value index of each variable by id, -1 if it is unassigned
+		self.assignment = [variable.domain.index(variable.value) if variable.assigned else -1 for variable in variables]
+		self.unassigned_counts = [sum(1 for other in constraint.variables if not other.assigned) for constraint in self.constraints]
+		# The ids of a variable's constraints are constraint_ids[constraint_starts[id]:constraint_starts[id + 1]], and of
+		# the other variable and the constraint of each of its binary constraints are neighbours and neighbour_constraints
+		# over the same range of neighbour_starts
+		self.constraint_starts = array('i', [0])
+		self.constraint_ids = array('i')
+		self.neighbour_starts = array('i', [0])
+		self.neighbours = array('i')
+		self.neighbour_constraints = array('i')
+		for variable in variables:
+			for constraint in variable.constraints:
+				self.constraint_ids.append(constraint.index)
+				if len(constraint.variables) == 2:
+					other = constraint.variables[1] if constraint.variables[0] is variable else constraint.variables[0]
+					self.neighbours.append(other.index)
+					self.neighbour_constraints.append(constraint.index)
+			self.constraint_starts.append(len(self.constraint_ids))
+			self.neighbour_starts.append(len(self.neighbours))
+		self.degrees = [self.count_degree(variable) for variable in variables]
+		del self.selection_heap[:]
+		self.dirty = set(variables)
+
 	def generate_assignment(self):
 		solution = {}
 		for variable in self.variables:
@@ -107,135 +857,913 @@ class ConstraintSatisfactionProblem:
 		return solution
 
 	def is_complete(self):
-		for variable in self.variables:
+		for variable in self.searched:
 			if not variable.assigned:
 				return False
 		return True
 
-	def solve(self):
+	"""
+	Finds a solution, or the cheapest one if there are soft constraints
+
+	Args:
+		deadline (number): optional, time.time() at which to stop searching
+		node_limit (int): optional, most nodes to expand
+		cancel (threading.Event): optional, stops the search once it is set, from any thread
+	Returns:
+		dictionary<Variable, ?>, None if there is no solution, or a Timeout if the search stopped first
+	"""
+	def solve(self, deadline=None, node_limit=None, cancel=None):
+		if self.soft_constraints:
+			best = self.optimize(1, deadline, node_limit, cancel)
+			if isinstance(best, Timeout):
+				return Timeout(best.reason, best.partial[0][1] if best.partial else None, best.statistics)
+			return best[0][1] if best else None
 		# Removes unary constraints, preprocesses with ac3, and then uses recursive backtracking
-		# Will return False, None, or [False, ...] respectively if failure
-		if not self.remove_unary() or self.make_inferences() is None or not self.backtracking_search()[0]:
+		if not self.preprocess():
+			return None
+		self.remove_entailed()
+		mark = len(self.trail)
+		self.set_limits(deadline, node_limit, cancel)
+		start = time.time()
+		found = True
+		try:
+			# Components keep their values while the next is searched, any one failing means there is no solution
+			for component in self.find_components():
+				self.search_component(component)
+				found = self.restart_search() if self.restarts else self.backtracking_search()[0]
+				if not found:
+					self.search_component(None)
+					self.reset(mark)
+					break
+		except BudgetExceeded as exceeded:
+			partial = dict((variable, variable.value) for variable in self.variables if variable.assigned)
+			self.search_component(None)
+			self.reset(mark)
+			self.times['search'] += time.time() - start
+			return Timeout(exceeded.reason, partial, self.statistics())
+		finally:
+			self.search_component(None)
+			self.restore_entailed()
+			self.set_limits()
+		self.times['search'] += time.time() - start
+		if not found:
 			return None
 		return self.generate_assignment()
 
+	"""
+	Leaves out of the search the constraints that every combination of the values left in the domains satisfies,
+	like two classes whose sections never meet on the same days. They are taken off their variables' lists of
+	constraints, so they are no longer checked, propagated or counted in degrees. Values are only pruned from
+	here on, so they stay entailed for the whole search. Unary constraints all are once remove_unary has run.
+	Call after preprocess, restore_entailed puts them back.
+	"""
+	def remove_entailed(self):
+		entailed = set(self.unary_constraints)
+		entailed.update(constraint for constraint in self.binary_constraints if self.is_binary_entailed(constraint))
+		entailed.update(constraint for constraint in self.nary_constraints if constraint.is_entailed())
+		self.entailed = list(entailed)
+		if not entailed:
+			return
+		for variable in self.variables:
+			self.detached[variable] = variable.constraints
+			variable.constraints = [constraint for constraint in variable.constraints if constraint not in entailed]
+		self.index_variables()
+
+	"""
+	Puts back the constraints remove_entailed left out, in their places, so the problem can be edited and searched
+	again. Variables can still hold the values of a solution.
+	"""
+	def restore_entailed(self):
+		if not self.detached:
+			return
+		for variable, constraints in self.detached.iteritems():
+			variable.constraints = constraints
+		self.detached = {}
+		for constraint in self.entailed:
+			# Its total was not kept while it was left out
+			if isinstance(constraint, LinearSumConstraint):
+				constraint.recount()
+		self.index_variables()
+
+	"""
+	Determines whether every pair of values left in a binary constraint's domains satisfies it. Without a
+	CompatibilityTable it would take checking every pair, more than the search usually spends on the constraint,
+	so only constraints with a table are found entailed.
+	"""
+	def is_binary_entailed(self, constraint):
+		table = self.tables[constraint.index]
+		if table is None:
+			return False
+		first, second = constraint.variables
+		rows = table.rows[0]
+		mask = second.domain.mask
+		return all(rows[index] & mask == mask for index in first.domain.live_indices())
+
+	"""
+	Splits the variables into groups that no constraint left after remove_entailed reaches across. A constraint with
+	links only joins the pairs of variables it gives, so one over every class can still be split between classes
+	that cannot overlap. Each group can be searched on its own and the solutions of the problem are every
+	combination of theirs, so a group with no solution is found without searching it again for every assignment of
+	the others.
+
+	Returns:
+		list<list<Variable>>
+		the components, smallest first. A small one is quick to solve or rule out, and counting leaves the largest,
+		the one most likely to run out of budget, for when the others are counted
+	"""
+	def find_components(self):
+		components = []
+		constraints = self.constraints
+		starts = self.constraint_starts
+		constraint_ids = self.constraint_ids
+		# Variables linked to each variable by id through each constraint by id with links, found when first reached
+		linked = [None] * len(constraints)
+		seen = bytearray(len(self.variables))
+		for variable in self.variables:
+			if seen[variable.index]:
+				continue
+			seen[variable.index] = 1
+			component = [variable]
+			# Grows as it is walked, breadth first
+			for member in component:
+				for position in xrange(starts[member.index], starts[member.index + 1]):
+					constraint = constraints[constraint_ids[position]]
+					if constraint.links is None:
+						others = constraint.variables
+					else:
+						if linked[constraint.index] is None:
+							linked[constraint.index] = [[] for other in self.variables]
+							for first, second in constraint.find_links():
+								linked[constraint.index][first.index].append(second)
+								linked[constraint.index][second.index].append(first)
+						others = linked[constraint.index][member.index]
+					for other in others:
+						if not seen[other.index]:
+							seen[other.index] = 1
+							component.append(other)
+			components.append(component)
+		self.components = len(components)
+		components.sort(key=len)
+		return components
+
+	"""
+	Restricts the search to one component from find_components, or None to search every variable again
+	"""
+	def search_component(self, component):
+		if component is None or len(component) == len(self.variables):
+			self.searched = self.variables
+			self.members = None
+		else:
+			self.searched = component
+			# Flag of each variable by id
+			self.members = bytearray(len(self.variables))
+			for variable in component:
+				self.members[variable.index] = 1
+		del self.selection_heap[:]
+		self.dirty.update(self.searched)
+
+	"""
+	Runs backtracking_search over and over, each run stopped after RESTART_SCALE times the next term of the Luby
+	sequence of nodes. The limits keep growing, so the search is still complete. What a run learns carries over:
+	constraints that wiped out domains weigh more in choosing variables, and its nogoods are kept. Ties between
+	variables are broken in a new random order each run.
+
+	Returns:
+		boolean whether a solution was found
+	"""
+	def restart_search(self):
+		mark = len(self.trail)
+		run = 1
+		try:
+			while True:
+				self.restart_at = self.nodes + RESTART_SCALE * luby(run)
+				self.limited = True
+				try:
+					return self.backtracking_search()[0]
+				except Restart:
+					self.reset(mark)
+					self.restart_count += 1
+					if self.trace is not None:
+						self.trace('restart', None, None)
+					order = list(self.variables)
+					self.random.shuffle(order)
+					for position, variable in enumerate(order):
+						self.positions[variable.index] = position
+					del self.selection_heap[:]
+					self.dirty.update(self.variables)
+					run += 1
+		finally:
+			self.restart_at = None
+
+	"""
+	Sets the budget checked at every node of the next search, no arguments removes it, see solve for the arguments
+	"""
+	def set_limits(self, deadline=None, node_limit=None, cancel=None):
+		self.deadline = deadline
+		# Node limits count from now, nodes is never reset
+		self.node_limit = None if node_limit is None else self.nodes + node_limit
+		self.cancel = cancel
+		self.limited = deadline is not None or node_limit is not None or cancel is not None
+
+	"""
+	Raises BudgetExceeded once a limit from set_limits is reached, or Restart at the end of a run of restart_search
+	"""
+	def check_limits(self):
+		if self.node_limit is not None and self.nodes > self.node_limit:
+			raise BudgetExceeded('node_limit')
+		if self.deadline is not None and time.time() >= self.deadline:
+			raise BudgetExceeded('deadline')
+		if self.cancel is not None and self.cancel.is_set():
+			raise BudgetExceeded('cancelled')
+		if self.restart_at is not None and self.nodes > self.restart_at:
+			raise Restart()
+
+	"""
+	Unassigns every variable and restores the values pruned since the trail was at mark,
+	for putting the problem back after a search was stopped part way
+	"""
+	def reset(self, mark):
+		for variable in self.searched:
+			if variable.assigned:
+				self.unassign(variable)
+		self.undo(mark)
+
+	"""
+	Removes values ruled out by unary constraints, then makes every arc consistent, timing both phases.
+	If a domain is wiped out the values pruned are restored, so the problem can be searched again.
+
+	Returns:
+		True, or False if a domain was wiped out and there is no solution
+	"""
+	def preprocess(self):
+		mark = len(self.trail)
+		start = time.time()
+		consistent = self.remove_unary()
+		self.times['remove_unary'] += time.time() - start
+		if consistent:
+			start = time.time()
+			consistent = self.make_inferences() is not None
+			self.times['make_inferences'] += time.time() - start
+		if not consistent:
+			self.undo(mark)
+		return consistent
+
+	"""
+	Gathers the search counters, constraint checks and phase times so far
+
+	Returns:
+		SolverStatistics
+	"""
+	def statistics(self):
+		return SolverStatistics(self)
+
+	"""
+	Lazily generates every solution from a single search. Each assignment is built when it is reached,
+	so callers can stop after as many schedules as they need.
+	Takes the same limits as solve, raises BudgetExceeded when one is reached, after the solutions found so far.
+
+	Returns:
+		generator<dictionary<Variable, ?>>
+	"""
+	def iter_solutions(self, deadline=None, node_limit=None, cancel=None):
+		if not self.preprocess():
+			return
+		# Every solution is generated from one search, so it is not split into components
+		self.remove_entailed()
+		self.set_limits(deadline, node_limit, cancel)
+		search = self.search_solutions()
+		try:
+			for _ in search:
+				yield self.generate_assignment()
+		finally:
+			search.close()
+			self.restore_entailed()
+			self.set_limits()
+
+	"""
+	Counts solutions without building an assignment for each one
+
+	Args:
+		limit (int): stop counting once this many solutions are found, None to count them all
+		deadline, node_limit, cancel: optional budget, see solve
+	Returns:
+		int, or a Timeout with the count so far
+	"""
+	def count_solutions(self, limit=None, deadline=None, node_limit=None, cancel=None):
+		if limit == 0 or not self.preprocess():
+			return 0
+		self.remove_entailed()
+		self.set_limits(deadline, node_limit, cancel)
+		components = self.find_components()
+		# The count is the product of the components' counts, any component up to the limit is enough
+		count = 1
+		try:
+			for position, component in enumerate(components):
+				self.search_component(component)
+				found = 0
+				search = self.search_solutions()
+				try:
+					for _ in search:
+						found += 1
+						if found == limit:
+							break
+				except BudgetExceeded as exceeded:
+					# Solutions of the whole problem are only known once every other component has one
+					last = position == len(components) - 1
+					return Timeout(exceeded.reason, count * found if last else 0, self.statistics())
+				finally:
+					search.close()
+				count *= found
+				if count == 0:
+					break
+		finally:
+			self.search_component(None)
+			self.restore_entailed()
+			self.set_limits()
+		return count if limit is None else min(count, limit)
+
+	"""
+	Finds the lowest cost assignments by branch and bound over the soft constraints
+
+	Args:
+		k (int): number of assignments to return
+		deadline, node_limit, cancel: optional budget, see solve
+	Returns:
+		list<(number, dictionary<Variable, ?>)>
+		up to k pairs of cost and assignment, cheapest first, empty if there is no solution,
+		or a Timeout with the list of the best found so far
+	"""
+	def optimize(self, k=1, deadline=None, node_limit=None, cancel=None):
+		# Max heap of the best k found so far as (-cost, order found, assignment)
+		best = []
+		stopped = None
+		if self.preprocess():
+			# Soft constraints tie every variable to the others, so the search is not split into components
+			self.remove_entailed()
+			mark = len(self.trail)
+			self.set_limits(deadline, node_limit, cancel)
+			start = time.time()
+			try:
+				self.branch_and_bound(k, best)
+			except BudgetExceeded as exceeded:
+				stopped = exceeded.reason
+				self.reset(mark)
+			finally:
+				self.restore_entailed()
+				self.set_limits()
+			self.times['search'] += time.time() - start
+		solutions = [(-cost, assignment) for cost, order, assignment in sorted(best, reverse=True)]
+		if stopped is not None:
+			return Timeout(stopped, solutions, self.statistics())
+		return solutions
+
+	"""
+	Sums the lower bounds of every soft constraint
+	"""
+	def objective_bound(self):
+		return sum(constraint.lower_bound() for constraint in self.soft_constraints)
+
+	"""
+	Backtracking search that records complete assignments in best and skips any subtree whose bound
+	cannot beat the worst of the k kept. Backtracks chronologically, pruning by bound is not a conflict.
+	"""
+	def branch_and_bound(self, k, best):
+		bound = self.objective_bound()
+		if len(best) == k and bound >= -best[0][0]:
+			return
+		if self.is_complete():
+			# Every soft constraint is assigned, so the bound is the cost
+			self.solutions_found += 1
+			if self.trace is not None:
+				self.trace('solution', None, None)
+			entry = (-bound, -self.solutions_found, self.generate_assignment())
+			if len(best) == k:
+				heapq.heapreplace(best, entry)
+			else:
+				heapq.heappush(best, entry)
+			return
+
+		self.nodes += 1
+		if self.limited:
+			self.check_limits()
+		variable = self.select_unassigned_variable()
+		for value in self.order_domain_values(variable):
+			if self.is_consistent(variable, value):
+				mark = len(self.trail)
+				self.assign(variable, value)
+				if self.trace is not None:
+					self.trace('assign', variable, value)
+				if self.make_inferences(variable) is not None:
+					self.branch_and_bound(k, best)
+				self.unassign(variable)
+				self.undo(mark)
+				self.backtracks += 1
+				if self.trace is not None:
+					self.trace('unassign', variable, value)
+
+	"""
+	Removes a value from a variable's domain, recording it on the trail so it can be undone
+	"""
+	def prune(self, variable, value):
+		variable.domain.remove(value)
+		self.trail.append(variable)
+		self.dirty.add(variable)
+		self.pruned += 1
+
+	"""
+	Restores every value pruned since the trail was at the given length
+	"""
+	def undo(self, mark):
+		trail = self.trail
+		while len(trail) > mark:
+			entry = trail.pop()
+			if entry.__class__ is tuple:
+				entry[0].conflict_set.discard(entry[1])
+			else:
+				entry.domain.restore_last()
+				self.dirty.add(entry)
+
+	"""
+	Adds culprits to a variable's conflict set, recording each new one on the trail so it can be undone
+	"""
+	def add_conflicts(self, variable, culprits):
+		conflict_set = variable.conflict_set
+		for culprit in culprits:
+			if culprit is not variable and culprit not in conflict_set:
+				conflict_set.add(culprit)
+				self.trail.append((variable, culprit))
+
+	"""
+	Assigns a value, recording its index in assignment and updating the degrees of variables left as the only
+	unassigned variable in a constraint
+	"""
+	def assign(self, variable, value):
+		variable.set_value(value)
+		index = variable.domain.index(value)
+		self.assignment[variable.index] = index
+		counts = self.unassigned_counts
+		degrees = self.degrees
+		for constraint in variable.constraints:
+			if isinstance(constraint, LinearSumConstraint):
+				constraint.total += constraint.weights[variable][index]
+			counts[constraint.index] -= 1
+			if counts[constraint.index] == 1:
+				for other in constraint.variables:
+					if not other.assigned:
+						degrees[other.index] -= self.weights[constraint.index]
+						self.dirty.add(other)
+
+	"""
+	Undoes assign
+	"""
+	def unassign(self, variable):
+		index = self.assignment[variable.index]
+		counts = self.unassigned_counts
+		degrees = self.degrees
+		for constraint in variable.constraints:
+			if isinstance(constraint, LinearSumConstraint):
+				constraint.total -= constraint.weights[variable][index]
+			if counts[constraint.index] == 1:
+				for other in constraint.variables:
+					if not other.assigned:
+						degrees[other.index] += self.weights[constraint.index]
+						self.dirty.add(other)
+			counts[constraint.index] += 1
+		variable.clear_value()
+		self.assignment[variable.index] = -1
+		degrees[variable.index] = self.count_degree(variable)
+		self.dirty.add(variable)
+
+	"""
+	Adds up the weights of the constraints on an unassigned variable that involve some other unassigned variable,
+	and the variable's own weight. Every constraint weighs one and every variable nothing unless the search has restarts.
+	"""
+	def count_degree(self, variable):
+		counts = self.unassigned_counts
+		weights = self.weights
+		constraint_ids = self.constraint_ids
+		degree = self.variable_weights[variable.index]
+		for position in xrange(self.constraint_starts[variable.index], self.constraint_starts[variable.index + 1]):
+			if counts[constraint_ids[position]] >= 2:
+				degree += weights[constraint_ids[position]]
+		return degree
+
+	"""
+	Makes what wiped out a domain weigh more in choosing variables, for dom/wdeg. A constraint on more than two
+	variables, like the ones on every class of a schedule, would weigh more for all of its variables alike, so the
+	variable it wiped out gains the weight instead.
+	"""
+	def bump_weight(self, constraint):
+		if len(constraint.variables) > 2:
+			variable = self.wiped_out
+			self.variable_weights[variable.index] += 1
+			self.degrees[variable.index] += 1
+			self.dirty.add(variable)
+			return
+		self.weights[constraint.index] += 1
+		if self.unassigned_counts[constraint.index] >= 2:
+			for variable in constraint.variables:
+				if not variable.assigned:
+					self.degrees[variable.index] += 1
+					self.dirty.add(variable)
+
 	def remove_unary(self):
 		for constraint in self.unary_constraints:
 			variable = constraint.variables[0]
-			for value in variable.domain:
-				if not constraint.is_satisfied({variable: value}):
-					variable.domain.remove(value)
+			for value in list(variable.domain):
+				if not constraint.check_unary(value):
+					self.prune(variable, value)
 					if not variable.domain:
 						return False
 		return True
 
-	def remove_inferences(self, inferences):
-		if inferences is not None:
-			for inference in inferences:
-				inference["variable"].domain.append(inference["removed_value"])
-		# TODO consider the conflcit set (inference has "conflict_source" key)
-
 	def backtracking_search(self):
 		if self.is_complete():
+			if self.trace is not None:
+				self.trace('solution', None, None)
 			return [True]
 
+		self.nodes += 1
+		if self.limited:
+			self.check_limits()
 		variable = self.select_unassigned_variable()
 		for value in self.order_domain_values(variable):
+			if self.backjumping and self.nogoods.watches:
+				# A value that completes a nogood fails for the same reason it did before, blame the rest of the nogood
+				others = self.nogoods.find(variable.index, variable.domain.index(value), self.assignment)
+				if others is not None:
+					self.nogood_skips += 1
+					self.add_conflicts(variable, [self.variables[other] for other in others])
+					continue
 			if self.is_consistent(variable, value):
-				variable.set_value(value)
-				inferences = self.make_inferences(variable)
-				if inferences is not None:
+				mark = len(self.trail)
+				self.assign(variable, value)
+				if self.trace is not None:
+					self.trace('assign', variable, value)
+				if self.make_inferences(variable) is not None:
 					result = self.backtracking_search()
 					if result[0]:
 						return result
-					# TODO consider the conflict set (keep backing up if variable not present)
-					# elif variable not in result[1]:
-					# 	return result
-				variable.clear_value()
-				self.remove_inferences(inferences)
+					conflict_set = result[1]
+				else:
+					conflict_set = set(self.wiped_out.conflict_set)
+				# Recorded by the deepest variable in it, while all of its variables still have their values
+				if self.backjumping and variable in conflict_set and self.nogoods.add(conflict_set, self.assignment):
+					self.learned += 1
+				self.unassign(variable)
+				self.undo(mark)
+				self.backtracks += 1
+				if self.trace is not None:
+					self.trace('unassign', variable, value)
+				if self.backjumping:
+					# The failure below did not depend on this variable, so no other value for it can help
+					if variable not in conflict_set:
+						self.backjumps += 1
+						if self.trace is not None:
+							self.trace('backjump', variable, None)
+						return [False, conflict_set]
+					self.add_conflicts(variable, conflict_set)
 
-		return [False, variable.conflict_set]
+		return [False, set(variable.conflict_set)]
+
+	"""
+	Backtracking search that yields at every complete assignment and then keeps going.
+	Backtracks chronologically, conflict sets only explain failures and a solution below a variable is not one.
+	Assignments and pruning are undone when the generator finishes or is closed.
+	"""
+	def search_solutions(self):
+		if self.is_complete():
+			if self.trace is not None:
+				self.trace('solution', None, None)
+			yield True
+			return
+
+		self.nodes += 1
+		if self.limited:
+			self.check_limits()
+		variable = self.select_unassigned_variable()
+		for value in self.order_domain_values(variable):
+			if self.is_consistent(variable, value):
+				mark = len(self.trail)
+				self.assign(variable, value)
+				if self.trace is not None:
+					self.trace('assign', variable, value)
+				try:
+					if self.make_inferences(variable) is not None:
+						for solution in self.search_solutions():
+							yield solution
+				finally:
+					self.unassign(variable)
+					self.undo(mark)
+				self.backtracks += 1
+				if self.trace is not None:
+					self.trace('unassign', variable, value)
 
 	def is_consistent(self, variable, value):
+		tables = self.tables
 		for constraint in variable.constraints:
-			value_map = {variable: value}
-			for other_variable in constraint.variables:
-				if other_variable.assigned:
-					value_map[other_variable] = other_variable.value
-			if not constraint.is_satisfied(value_map):
+			table = tables[constraint.index]
+			if table is not None:
+				other = constraint.variables[0] if constraint.variables[1] is variable else constraint.variables[1]
+				if other.assigned and not table.is_satisfied(variable, value, other, other.value):
+					if self.backjumping:
+						self.add_conflicts(variable, (other,))
+					return False
+				continue
+			if not constraint.check_assigned(variable, value):
+				if self.backjumping:
+					self.add_conflicts(variable, (v for v in constraint.variables if v.assigned))
 				return False
 		return True
 
 	def select_unassigned_variable(self):
-		# Makes a list from variables, sorts by degree, then sorts by minimum remaining values
-		return sorted(
-			# Sorted list decreasing by number of undetermined constraints
-			sorted((v for v in self.variables if not v.assigned), key=(lambda var:
-				# Counts constraints with not all values assigned
-				sum(1 for constraint in var.constraints
-					if not all(v.assigned or v == var for v in constraint.variables))),
-				reverse=True)
-			, key=(lambda var: len(var.domain)))[0]
+		# Minimum remaining values, then largest number of undetermined constraints, then problem order
+		# With restarts the remaining values are divided by the weighted degree
+		# Entries go stale when a variable is assigned or its key changes, stale entries are dropped as they surface
+		heap = self.selection_heap
+		if len(heap) > 4 * len(self.variables):
+			del heap[:]
+			self.dirty.update(self.variables)
+		weighted = self.restarts
+		members = self.members
+		degrees = self.degrees
+		positions = self.positions
+		for variable in self.dirty:
+			if not variable.assigned and (members is None or members[variable.index]):
+				size = self.weighted_size(variable) if weighted else len(variable.domain)
+				heapq.heappush(heap, (size, -degrees[variable.index], positions[variable.index], variable))
+		self.dirty.clear()
+		while True:
+			size, degree, position, variable = heap[0]
+			current = self.weighted_size(variable) if weighted else len(variable.domain)
+			if not variable.assigned and size == current and degree == -degrees[variable.index]:
+				return variable
+			heapq.heappop(heap)
+
+	"""
+	Divides a variable's domain size by its weighted degree, a variable on no undetermined constraint goes last
+	"""
+	def weighted_size(self, variable):
+		degree = self.degrees[variable.index]
+		return float(len(variable.domain)) / degree if degree else float('inf')
 
 	def order_domain_values(self, variable):
-		binary_constraints = [constraint for constraint in variable.constraints if len(constraint.variables) == 2]
-		return sorted(variable.domain, key=(lambda val: self.determine_constrained_values(val, variable, binary_constraints)))
+		# Binary constraints on the variable and the other variable in each
+		neighbours = [(self.constraints[self.neighbour_constraints[position]], self.variables[self.neighbours[position]])
+			for position in xrange(self.neighbour_starts[variable.index], self.neighbour_starts[variable.index + 1])]
+		values = sorted(variable.domain, key=(lambda val: self.determine_constrained_values(val, variable, neighbours)))
+		if self.hints:
+			# A hinted value goes first, the rest stay least constraining first
+			hint = self.hints.get(variable, UNASSIGNED)
+			if hint is not UNASSIGNED and hint in variable.domain:
+				values = [hint] + [value for value in values if value is not hint]
+		return values
 
-	def determine_constrained_values(self, value, variable, binary_constraints):
+	def determine_constrained_values(self, value, variable, neighbours):
 		conflicts = 0
-		for constraint in binary_constraints:
-			other_variable = constraint.variables[0] if constraint.variables[1] == variable else constraint.variables[1]
+		for constraint, other_variable in neighbours:
+			first = constraint.variables[0] is variable
+			table = self.tables[constraint.index]
+			if table is not None:
+				conflicts += count_bits(other_variable.domain.mask & ~table.row(variable, value))
+				continue
 			for other_value in other_variable.domain:
-				if not constraint.is_satisfied({variable: value, other_variable: other_value}):
+				if not (constraint.check_binary(value, other_value) if first else constraint.check_binary(other_value, value)):
 					conflicts += 1
 		return conflicts
 
-	def make_inferences(self, variable=None):
-		inferences = []
+	"""
+	Runs AC-3 over the binary constraints, from every arc or just the arcs of a newly assigned variable.
+	An arc already waiting in the queue is not added again.
+	Pruned values are left on the trail for the caller to undo.
 
+	Returns:
+		True, or None if a domain was wiped out
+	"""
+	def make_inferences(self, variable=None):
 		queue = deque([])
+		# Flags of the arcs and propagating constraints waiting in the queue, each only needs to be run once per change.
+		# The arc from a constraint's first variable is at twice its id, from its second one after, see queue_constraints
+		queued = bytearray(2 * len(self.constraints))
 		if variable is None:
 			for arc in self.binary_constraints:
 				queue.append((arc.variables[0], arc))
+				queued[2 * arc.index] = 1
+			for constraint in self.nary_constraints:
+				if constraint.propagates:
+					queue.append((None, constraint))
+					queued[2 * constraint.index] = 1
 		else:
-			for arc in variable.constraints:
-				if len(arc.variables) == 2:
-					queue.append((variable, arc))
+			self.queue_constraints(variable, queue, queued)
 
 		while queue:
 			start, arc = queue.popleft()
-			new_inferences = self.remove_inconsistent_values(arc, start)
-			if new_inferences is None:
-				self.remove_inferences(inferences)
+			if len(arc.variables) > 2:
+				queued[2 * arc.index] = 0
+				changed = self.run_propagator(arc)
+				if changed is None:
+					if self.restarts:
+						self.bump_weight(arc)
+					return None
+				for next in changed:
+					self.queue_constraints(next, queue, queued)
+				continue
+			queued[2 * arc.index + (arc.variables[1] is start)] = 0
+			removed = self.remove_inconsistent_values(arc, start)
+			if removed is None:
+				self.wiped_out = arc.variables[0] if arc.variables[1] == start else arc.variables[1]
+				if self.restarts:
+					self.bump_weight(arc)
 				return None
-			elif new_inferences:
-				inferences += new_inferences
+			elif removed:
 				next = list(arc.variables)
 				next.remove(start)
-				for new_arc in next[0].constraints:
-					if len(new_arc.variables) == 2:
-						queue.append((next[0], new_arc))
+				self.queue_constraints(next[0], queue, queued)
 
-		return inferences
+		return True
 
+	"""
+	Adds the binary arcs out of a variable and its propagating constraints to the make_inferences queue
+	"""
+	def queue_constraints(self, variable, queue, queued):
+		for constraint in variable.constraints:
+			if len(constraint.variables) == 2:
+				flag = 2 * constraint.index + (constraint.variables[1] is variable)
+				if not queued[flag]:
+					queue.append((variable, constraint))
+					queued[flag] = 1
+			elif constraint.propagates and len(constraint.variables) > 2 and not queued[2 * constraint.index]:
+				queue.append((variable, constraint))
+				queued[2 * constraint.index] = 1
+
+	"""
+	Prunes the values a propagating constraint rules out
+
+	Returns:
+		list<Variable> the variables that lost values, or None if a domain was wiped out
+	"""
+	def run_propagator(self, constraint):
+		self.propagations += 1
+		changed = []
+		for variable, value, culprits in constraint.find_removals():
+			if value not in variable.domain:
+				continue
+			self.prune(variable, value)
+			if self.backjumping:
+				# Like a revise, blame assigned culprits and whatever narrowed the domains of unassigned ones
+				for culprit in culprits:
+					self.add_conflicts(variable, (culprit,) if culprit.assigned else culprit.conflict_set)
+			if not variable.domain:
+				self.wiped_out = variable
+				return None
+			if not changed or changed[-1] is not variable:
+				changed.append(variable)
+		return changed
+
+	"""
+	Prunes the values of the other variable in constraint that have no support in start's domain.
+	The support found for each value is remembered and tried first the next time, as in AC-3rm.
+
+	Returns:
+		the number of values pruned, or None if the other variable's domain was wiped out
+	"""
 	def remove_inconsistent_values(self, constraint, start):
-		inferences = []
-		other = list(constraint.variables)
-		other.remove(start)
-		other = other[0]
+		self.revisions += 1
+		removed = 0
+		first = constraint.variables[0] is start
+		other = constraint.variables[1] if first else constraint.variables[0]
 		if not other.assigned:
-			for value2 in list(other.domain):
-				relevant = False
-				for value1 in start.domain if not start.assigned else [start.value]:
-					val_map = { start: value1, other: value2 }
-					if constraint.is_satisfied(val_map):
-						relevant = True
+			table = self.tables[constraint.index]
+			start_domain = start.domain
+			if start.assigned:
+				start_index = start_domain.index(start.value)
+				start_mask = 1 << start_index
+				candidates = (start_index,)
+			else:
+				start_mask = start_domain.mask
+				candidates = None
+			if table is None:
+				# Last support found for each of other's values, by value index, kept through backtracking
+				side = 2 * constraint.index + first
+				residues = self.residues[side]
+				if residues is None:
+					residues = self.residues[side] = [-1] * len(other.domain.values)
+				start_values = start_domain.values
+				positions = start_domain.positions
+			else:
+				rows = table.rows[1 if first else 0]
+			# Values lose their support because of start's value, or whatever narrowed start's domain
+			culprits = (start,) if start.assigned else start.conflict_set
+			values = other.domain.values
+			for index2 in other.domain.live_indices():
+				if table is not None:
+					relevant = rows[index2] & start_mask != 0
+				else:
+					# A support that is still live saves looking for one
+					residue = residues[index2]
+					relevant = residue >= 0 and (residue == start_index if candidates else positions[residue] < start_domain.size)
+					if not relevant:
+						value2 = values[index2]
+						for index1 in candidates or start_domain.live_indices():
+							value1 = start_values[index1]
+							if constraint.check_binary(value1, value2) if first else constraint.check_binary(value2, value1):
+								residues[index2] = index1
+								relevant = True
+								break
 				if not relevant:
-					inferences.append({"variable": other, "removed_value": value2, "conflict_source": start})
-					other.domain.remove(value2)
-					other.add_conflict(start)
+					removed += 1
+					self.prune(other, values[index2])
+					if self.backjumping:
+						self.add_conflicts(other, culprits)
 					if not other.domain:
-						self.remove_inferences(inferences)
 						return None
-		return inferences
+		return removed
+
+
+
+"""
+	Class to represent a problem that is edited and solved again, for changes made one at a time like a student
+	adjusting a schedule. Variables and constraints can be added and removed between searches.
+	Adding a constraint only rules more out, so the values pruned for the last search stay pruned and the next
+	search only filters what the new constraint rules out. Removing one can make pruned values possible again,
+	so all pruning is taken back and redone, unless the caller says the constraints left still rule out as much.
+	Each search tries the previous solution's values first, an edit usually leaves most of it in place.
+"""
+class IncrementalProblem(ConstraintSatisfactionProblem):
+	def __init__(self, variables, constraints, use_tables=False, backjumping=True, soft_constraints=(), trace=None,
+			nogood_limit=1000, restarts=False, seed=0):
+		ConstraintSatisfactionProblem.__init__(self, variables, constraints, use_tables, backjumping, soft_constraints, trace,
+			nogood_limit, restarts, seed)
+		self.use_tables = use_tables
+		# Length of the trail after the last preprocess, searches are undone back to it
+		self.preprocessed = 0
+
+	def add_constraint(self, constraint):
+		if len(constraint.variables) == 1:
+			self.unary_constraints.append(constraint)
+		elif len(constraint.variables) == 2:
+			self.binary_constraints.append(constraint)
+		else:
+			self.nary_constraints.append(constraint)
+		self.assign_ids()
+		if self.use_tables and len(constraint.variables) == 2:
+			self.tables[constraint.index] = CompatibilityTable(constraint)
+		self.index_variables()
+
+	"""
+	Args:
+		constraint (Constraint): a constraint in this problem
+		loosens (boolean): False if the remaining constraints rule out everything this one did,
+			like when it is replaced by one over more variables, so the values pruned for it can stay pruned
+	"""
+	def remove_constraint(self, constraint, loosens=True):
+		for constraints in (self.unary_constraints, self.binary_constraints, self.nary_constraints):
+			if constraint in constraints:
+				constraints.remove(constraint)
+		for variable in constraint.variables:
+			variable.constraints.remove(constraint)
+		if loosens:
+			self.preprocessed = 0
+			# Nogoods may have depended on the constraint
+			self.nogoods.clear()
+		self.assign_ids()
+		self.index_variables()
+
+	def add_variable(self, variable):
+		variable.conflict_set = set([])
+		self.variables.append(variable)
+		self.assign_ids()
+		self.index_variables()
+
+	"""
+	Removes a variable and every constraint on it
+	"""
+	def remove_variable(self, variable):
+		for constraint in list(variable.constraints):
+			self.remove_constraint(constraint)
+		self.hints.pop(variable, None)
+		self.variables.remove(variable)
+		# The variables after it move down an id, nogoods name variables by id
+		self.nogoods.clear()
+		self.assign_ids()
+		self.index_variables()
+
+	"""
+	Solves like ConstraintSatisfactionProblem.solve, then takes the search back so the problem can be edited.
+	The solution becomes the hints for the next search.
+	"""
+	def solve(self, deadline=None, node_limit=None, cancel=None):
+		solution = ConstraintSatisfactionProblem.solve(self, deadline, node_limit, cancel)
+		if solution:
+			self.hints = solution
+		self.reset(min(self.preprocessed, len(self.trail)))
+		return solution
 
+	def preprocess(self):
+		# Takes back the pruning an edit made invalid, all of it if a constraint was removed
+		self.undo(self.preprocessed)
+		# Undoing can restore the domain of a removed variable, only index the ones still here
+		self.index_variables()
+		consistent = ConstraintSatisfactionProblem.preprocess(self)
+		self.preprocessed = len(self.trail)
+		return consistent
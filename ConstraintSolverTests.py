@@ -1,6 +1,7 @@
-from ConstraintSolver import Variable, Constraint, ConstraintSatisfactionProblem
+from ConstraintSolver import Variable, Constraint, LinearSumConstraint, SoftConstraint, ConstraintSatisfactionProblem, IncrementalProblem, UNASSIGNED, positional
+from ParallelSolver import solve_parallel
 
-def austrailia_test():
+def austrailia_problem(use_tables=False):
 	domain = ["Red", "Green", "Blue"]
 	
 	variables = [
@@ -25,8 +26,67 @@ def austrailia_test():
 		Constraint([variables[4], variables[5]], test_not_equal)
 	]
 
-	problem = ConstraintSatisfactionProblem(variables, constraints)
-	return problem.solve()
+	return ConstraintSatisfactionProblem(variables, constraints, use_tables)
+
+
+def austrailia_test(use_tables=False):
+	return austrailia_problem(use_tables).solve()
+
+
+def austrailia_solutions_test():
+	# Six colorings of the mainland, South Australia picks a color and the rest alternate, times three for Tasmania
+	solutions = list(austrailia_problem().iter_solutions())
+	return len(solutions), austrailia_problem().count_solutions(), austrailia_problem().count_solutions(limit=5)
+
+
+def austrailia_optimize_test():
+	# Only South Australia can be the lone red region, four colorings do it, the next best have two red regions
+	problem = austrailia_problem()
+	problem.soft_constraints = [SoftConstraint([variable], cost_red) for variable in problem.variables]
+	return [cost for cost, solution in problem.optimize(k=5)]
+
+
+def austrailia_statistics_test():
+	# Records every decision, the counters should agree with the trace
+	events = []
+	problem = austrailia_problem()
+	problem.trace = lambda event, variable, value: events.append(event)
+	problem.solve()
+	statistics = problem.statistics()
+	return (statistics.nodes, events.count('assign'), events.count('unassign') == statistics.backtracks,
+		statistics.checks['test_not_equal'] > 0, sorted(statistics.times))
+
+
+def austrailia_budget_test():
+	# Stops part way through counting, then counts them all once the budget is lifted
+	problem = austrailia_problem()
+	timeout = problem.count_solutions(node_limit=8)
+	return timeout.reason, timeout.partial, bool(timeout), problem.count_solutions()
+
+
+def austrailia_incremental_test():
+	# Forcing Tasmania and Victoria to match only adds a constraint, taking it away again redoes the pruning
+	problem = austrailia_problem()
+	problem = IncrementalProblem(problem.variables, problem.binary_constraints)
+	tasmania, victoria = problem.variables[6], problem.variables[5]
+	first = problem.solve()
+	same = Constraint([tasmania, victoria], test_equal)
+	problem.add_constraint(same)
+	second = problem.solve()
+	problem.remove_constraint(same)
+	problem.add_constraint(Constraint([tasmania, victoria], test_not_equal))
+	third = problem.solve()
+	return second[tasmania] == second[victoria], third[tasmania] != third[victoria], second[victoria] == first[victoria]
+
+
+def test_equal(variables, value_map, extras):
+	return len(set(value_map.values())) <= 1
+
+
+def cost_red(variables, value_map, extras):
+	if value_map[variables[0]] == "Red":
+		return 1
+	return 0
 
 
 def test_not_equal(variables, value_map, extras):
@@ -39,6 +99,116 @@ def test_not_equal(variables, value_map, extras):
 	return True
 
 print austrailia_test()
+print austrailia_test(use_tables=True)
+print austrailia_solutions_test()
+print austrailia_optimize_test()
+print austrailia_statistics_test()
+print austrailia_budget_test()
+print austrailia_incremental_test()
+print solve_parallel(austrailia_problem(), processes=2)
+
+"==================================================================================================="
+
+def pigeonhole_problem(backjumping=True, joined=True):
+	# Independent two-valued variables are picked first, then four variables that cannot fit into three values
+	variables = [Variable("A" + str(i), [0, 1]) for i in xrange(8)]
+	holes = [Variable("P" + str(i), [0, 1, 2]) for i in xrange(4)]
+
+	constraints = []
+	for i in xrange(len(holes)):
+		for j in xrange(i):
+			constraints.append(Constraint([holes[i], holes[j]], test_not_equal_values))
+	if joined:
+		# Keeps every variable in one component, so the search has to get past the independent ones
+		constraints.append(Constraint(variables + holes, test_anything))
+
+	return ConstraintSatisfactionProblem(variables + holes, constraints, backjumping=backjumping)
+
+def backjumping_test(backjumping):
+	problem = pigeonhole_problem(backjumping)
+	return problem.solve(), problem.nodes, problem.backjumps
+
+def nogood_test():
+	# The nogoods from the first search cut values from the second without trying them
+	problem = pigeonhole_problem()
+	problem.solve()
+	nodes = problem.nodes
+	return problem.solve(), nodes, problem.nodes - nodes, problem.learned, problem.nogood_skips
+
+def components_test():
+	# Apart from the independent variables the holes fail on their own, even backtracking chronologically.
+	# Tasmania is counted apart from the mainland, and a total no assignment can exceed is left out
+	pigeonhole = pigeonhole_problem(False, joined=False)
+	holes = pigeonhole.variables[8:]
+	total = LinearSumConstraint(holes, lambda variable, value: value, maximum=8)
+	problem = ConstraintSatisfactionProblem(pigeonhole.variables, pigeonhole.binary_constraints + [total], backjumping=False)
+	solution = problem.solve()
+	statistics = problem.statistics()
+	counted = austrailia_problem()
+	return solution, problem.nodes, statistics.components, statistics.entailed, counted.count_solutions(), counted.components
+
+def linear_sum_test():
+	# Ten hours cannot be reached without taking every class, and the heavy section would then go over eleven
+	variables = [Variable("X", ["x", None]), Variable("Y", ["y", None]), Variable("Z", ["light", "heavy", None])]
+	problem = ConstraintSatisfactionProblem(variables, [LinearSumConstraint(variables, weigh_hours, minimum=10, maximum=11)])
+	consistent = problem.preprocess()
+	pruned = problem.statistics().pruned
+	domains = [list(variable.domain) for variable in variables]
+	solution = problem.solve()
+	return consistent, pruned, domains, problem.backtracks, sorted(solution.values())
+
+def unreachable_sum_test():
+	# Twelve hours are out of reach of three classes, preprocessing wipes out a domain and has to put it back
+	# for the problem to be searched again
+	variables = [Variable(name, ["x", None]) for name in ("X", "Y", "Z")]
+	problem = ConstraintSatisfactionProblem(variables, [LinearSumConstraint(variables, weigh_hours, minimum=12)])
+	return problem.count_solutions(), problem.count_solutions(), problem.solve(), [len(variable.domain) for variable in variables]
+
+def weigh_hours(variable, value):
+	return {"x": 3, "y": 4, "light": 3, "heavy": 5}.get(value, 0)
+
+@positional
+def test_not_equal_values(variables, values, extras):
+	return values[0] is UNASSIGNED or values[0] != values[1]
+
+@positional
+def test_anything(variables, values, extras):
+	return True
+
+def queens_problem(size, restarts=False, seed=0):
+	variables = [Variable("Q" + str(column), range(size)) for column in xrange(size)]
+	constraints = []
+	for i in xrange(size):
+		for j in xrange(i):
+			constraints.append(Constraint([variables[j], variables[i]], test_queens_safe, distance=i - j))
+	return ConstraintSatisfactionProblem(variables, constraints, restarts=restarts, seed=seed)
+
+@positional
+def test_queens_safe(variables, values, extras):
+	if values[0] is UNASSIGNED or values[1] is UNASSIGNED:
+		return True
+	return values[0] != values[1] and abs(values[0] - values[1]) != extras['distance']
+
+def restart_test():
+	# Eighteen queens takes over a thousand nodes in problem order, a restart finds the solution much sooner
+	plain = queens_problem(18)
+	plain.solve()
+	results = []
+	for attempt in xrange(2):
+		problem = queens_problem(18, restarts=True, seed=1)
+		solution = problem.solve()
+		constraints = problem.binary_constraints
+		results.append((all(constraint.is_satisfied(solution) for constraint in constraints), problem.restart_count,
+			problem.nodes < plain.nodes, sorted((variable.data, value) for variable, value in solution.items())))
+	return results[0][:3], results[0] == results[1]
+
+print backjumping_test(True)
+print backjumping_test(False)
+print nogood_test()
+print components_test()
+print linear_sum_test()
+print unreachable_sum_test()
+print restart_test()
 
 "==================================================================================================="
 
@@ -0,0 +1,188 @@
+"""
+Solves a ConstraintSatisfactionProblem on a pool of processes by splitting the search tree.
+
+The first few decision levels are expanded in this process, each consistent partial assignment becomes a task,
+and workers search below it. Every worker receives a pickled copy of the preprocessed problem once, so the
+constraint and cost functions have to be picklable, module level functions rather than lambdas.
+Solutions come back as value indices and are mapped onto the caller's variables.
+"""
+
+import cPickle
+import heapq
+import multiprocessing
+
+from ConstraintSolver import BudgetExceeded, Timeout
+
+# The problem copy in a worker process, set by load_problem
+worker_problem = None
+
+
+"""
+Finds a solution using processes workers, or the cheapest k if the problem has soft constraints.
+
+Args:
+	problem (ConstraintSatisfactionProblem): a problem that has not been solved yet
+	processes (int): number of worker processes, defaults to the number of cpus
+	split_depth (int): number of decision levels expanded before handing work to the pool
+	k (int): number of assignments to keep when optimizing
+	deadline (number): optional, time.time() at which every worker stops
+	cancel (threading.Event): optional, stops the workers once it is set
+Returns:
+	dictionary<Variable, ?> or None like solve, or like optimize if the problem has soft constraints,
+	or a Timeout with the best found so far when optimizing, nothing when not
+"""
+def solve_parallel(problem, processes=None, split_depth=2, k=1, deadline=None, cancel=None):
+	optimizing = bool(problem.soft_constraints)
+	if not problem.preprocess():
+		return [] if optimizing else None
+
+	data = cPickle.dumps(problem, cPickle.HIGHEST_PROTOCOL)
+	prefixes = []
+	expand_prefixes(problem, split_depth, [], prefixes)
+
+	pool = multiprocessing.Pool(processes, initializer=load_problem, initargs=(data,))
+	# Max heap of the best k as (-cost, order found, indices) when optimizing
+	best = []
+	stopped = None
+	try:
+		tasks = [(prefix, optimizing, k, deadline) for prefix in prefixes]
+		results = pool.imap_unordered(solve_prefix, tasks)
+		for order in xrange(len(tasks)):
+			nodes, found, reason = next_result(results, cancel)
+			problem.nodes += nodes
+			stopped = stopped or reason
+			if not optimizing:
+				if found is not None:
+					# First solution wins, stop the other workers
+					pool.terminate()
+					apply_indices(problem, found)
+					return problem.generate_assignment()
+				continue
+			for cost, indices in found:
+				entry = (-cost, -order, indices)
+				if len(best) < k:
+					heapq.heappush(best, entry)
+				elif entry > best[0]:
+					heapq.heapreplace(best, entry)
+		pool.close()
+	except BudgetExceeded as exceeded:
+		stopped = exceeded.reason
+	finally:
+		pool.terminate()
+		pool.join()
+
+	solutions = []
+	for cost, order, indices in sorted(best, reverse=True):
+		apply_indices(problem, indices)
+		solutions.append((-cost, problem.generate_assignment()))
+	if stopped is not None:
+		return Timeout(stopped, solutions if optimizing else None, problem.statistics())
+	return solutions if optimizing else None
+
+
+"""
+Waits for the next result from the pool, raising BudgetExceeded when cancelled.
+Workers stop themselves at the deadline, so tasks still queued then come back straight away with what they found.
+"""
+def next_result(results, cancel):
+	if cancel is None:
+		return results.next()
+	while not cancel.is_set():
+		try:
+			# Wake up now and then to look at the cancel event
+			return results.next(0.1)
+		except multiprocessing.TimeoutError:
+			pass
+	raise BudgetExceeded('cancelled')
+
+
+"""
+Collects every consistent assignment of the first depth variables the search would choose, as lists of
+(variable position, value index). Stops early at complete assignments. Leaves the problem as it found it.
+"""
+def expand_prefixes(problem, depth, prefix, prefixes):
+	if depth == 0 or problem.is_complete():
+		prefixes.append(list(prefix))
+		return
+
+	variable = problem.select_unassigned_variable()
+	for value in problem.order_domain_values(variable):
+		if problem.is_consistent(variable, value):
+			mark = len(problem.trail)
+			problem.assign(variable, value)
+			if problem.make_inferences(variable) is not None:
+				prefix.append((variable.index, variable.domain.index(value)))
+				expand_prefixes(problem, depth - 1, prefix, prefixes)
+				prefix.pop()
+			problem.unassign(variable)
+			problem.undo(mark)
+
+
+"""
+Assigns every variable from a list of value indices in problem order
+"""
+def apply_indices(problem, indices):
+	for variable, index in zip(problem.variables, indices):
+		variable.set_value(variable.domain.values[index])
+
+
+"""
+Gives the value index of every variable in problem order
+"""
+def assignment_indices(problem):
+	return list(problem.assignment)
+
+
+"""
+Pool initializer, keeps the worker's copy of the problem
+"""
+def load_problem(data):
+	global worker_problem
+	worker_problem = cPickle.loads(data)
+
+
+"""
+Searches below a prefix in a worker.
+
+Args:
+	task ((list<(int, int)>, boolean, int, number)): the prefix, whether to optimize, how many assignments to keep,
+		and the deadline or None
+Returns:
+	(int, ?, string) nodes expanded, the solution indices or None, or a list of (cost, indices) when optimizing,
+	and the reason the search stopped early or None
+"""
+def solve_prefix(task):
+	prefix, optimizing, k, deadline = task
+	problem = worker_problem
+	nodes = problem.nodes
+	mark = len(problem.trail)
+	best = []
+	try:
+		for position, index in prefix:
+			variable = problem.variables[position]
+			value = variable.domain.values[index]
+			problem.assign(variable, value)
+			if problem.make_inferences(variable) is None:
+				return problem.nodes - nodes, [] if optimizing else None, None
+
+		problem.set_limits(deadline)
+		if optimizing:
+			problem.branch_and_bound(k, best)
+			return problem.nodes - nodes, best_indices(problem, best), None
+		if problem.backtracking_search()[0]:
+			return problem.nodes - nodes, assignment_indices(problem), None
+		return problem.nodes - nodes, None, None
+	except BudgetExceeded as exceeded:
+		return problem.nodes - nodes, best_indices(problem, best) if optimizing else None, exceeded.reason
+	finally:
+		# Workers take several tasks, put the problem back to its preprocessed state
+		problem.set_limits()
+		problem.reset(mark)
+
+
+"""
+Gives the (cost, indices) of each assignment in a branch_and_bound heap
+"""
+def best_indices(problem, best):
+	return [(-cost, [variable.domain.index(solution[variable]) for variable in problem.variables])
+		for cost, order, solution in best]
@@ -0,0 +1,174 @@
+"""
+Solves many schedule requests against one catalog.
+
+The catalog is compiled once, every section's meetings are parsed and every pair of overlapping sections is
+indexed, see SchedulingConstraints.compile_catalog. Each request only builds variables and constraints for the
+classes it considers, sharing the compiled sections. Sections outside a request's day_start and day_end are left
+out of the domains with a mask over the whole catalog, kept for the next request with the same times.
+With a pool of processes every worker receives a pickled copy of the compiled catalog once, then takes requests as
+they come. A service saved to a file with save is loaded from it by open_service and by each worker, without
+compiling the catalog again.
+A request for the same classes and parameters as an earlier one is answered from a SolutionCache without a search.
+Results name classes as '[school] [number]' and sections by name, so they mean the same thing in any process.
+"""
+
+import cPickle
+import hashlib
+import multiprocessing
+import time
+
+from CompiledFile import save_compiled, load_compiled
+from ConstraintParser import create_variables, create_problem
+from ConstraintSolver import Timeout
+from SchedulingConstraints import compile_catalog
+from SolutionCache import SolutionCache, canonical
+
+# The service in a worker process, set by load_service
+worker_service = None
+
+
+class ScheduleService:
+	"""
+	Args:
+		classes (list<(dictionary, list<dictionary>)>): every class in the catalog and its sections,
+			as given by CatalogLoader.load_classes
+		time_limit (number): optional, seconds each request may search for
+		node_limit (int): optional, most search nodes each request may expand
+		cache_size (int): most results of earlier requests kept, 0 to search for every request
+		cache_dir (string): optional, directory to keep the results in, see SolutionCache
+	"""
+	def __init__(self, classes, time_limit=None, node_limit=None, cache_size=1000, cache_dir=None):
+		self.columns = compile_catalog(classes)
+		self.classes = dict((class_name(class_info), (class_info, sections)) for class_info, sections in classes)
+		self.time_limit = time_limit
+		self.node_limit = node_limit
+		self.cache = SolutionCache(cache_size, cache_dir, catalog_version(classes), catalog_key) if cache_size else None
+		# File the service was saved to or opened from, see save
+		self.path = None
+
+	"""
+	Saves the service with its compiled catalog to a file for open_service. Pools of workers started from now on
+	load the service from the file, as it was saved, instead of each being sent a copy.
+	"""
+	def save(self, path):
+		self.path = None
+		save_compiled(self, path)
+		self.path = path
+
+	"""
+	Makes one schedule, see ConstraintParser.create_schedule for the arguments.
+
+	Returns:
+		dictionary<string, string> the section name taken for each class considered, None for a class not taken,
+		None if there is no schedule, or a Timeout with the section names assigned so far
+	"""
+	def solve(self, classes_considered, parameters):
+		variables = create_variables([self.classes[name] for name in classes_considered])
+		problem = create_problem(variables, parameters, columns=self.columns)
+		deadline = None if self.time_limit is None else time.time() + self.time_limit
+		search = lambda: problem.solve(deadline, self.node_limit)
+		solution = self.cache.solve(problem, search) if self.cache is not None else search()
+		if isinstance(solution, Timeout):
+			partial = section_names(solution.partial) if solution.partial is not None else None
+			return Timeout(solution.reason, partial, solution.statistics)
+		if solution is None:
+			return None
+		return section_names(solution)
+
+	"""
+	Makes a schedule for every request, yielding each as soon as it is done.
+
+	Args:
+		requests (list<(list<string>, dictionary<string, ?>)>): the classes considered and parameters of each request
+		processes (int): optional, solve on a pool of this many worker processes, 0 for the number of cpus
+	Returns:
+		generator<(int, ?)>
+		the position of a request and its result from solve, in the order they finish
+	"""
+	def solve_all(self, requests, processes=None):
+		if processes is None:
+			for index, (classes_considered, parameters) in enumerate(requests):
+				yield index, self.solve(classes_considered, parameters)
+			return
+
+		if self.path is not None:
+			pool = multiprocessing.Pool(processes or None, initializer=load_service_file, initargs=(self.path,))
+		else:
+			data = cPickle.dumps(self, cPickle.HIGHEST_PROTOCOL)
+			pool = multiprocessing.Pool(processes or None, initializer=load_service, initargs=(data,))
+		try:
+			# Requests are quick, hand them out a few at a time to save on round trips
+			for result in pool.imap_unordered(solve_request, enumerate(requests), 4):
+				yield result
+			pool.close()
+		finally:
+			pool.terminate()
+			pool.join()
+
+
+"""
+Loads a service saved with ScheduleService.save
+"""
+def open_service(path):
+	service = load_compiled(path)
+	service.path = path
+	return service
+
+
+def class_name(class_info):
+	return str(class_info['school']) + ' ' + str(class_info['name'])
+
+
+"""
+Fingerprints a compiled catalog, so results kept on disk for another catalog are not used
+"""
+def catalog_version(classes):
+	return hashlib.sha1(repr(canonical(classes))).hexdigest()
+
+
+"""
+Identifies a class by its name or a section by its id in the compiled catalog, for fingerprinting requests
+"""
+def catalog_key(info):
+	if info is None:
+		return None
+	if 'id' in info:
+		return info['id']
+	return class_name(info)
+
+
+"""
+Converts an assignment of variables to sections into class names and section names
+"""
+def section_names(assignment):
+	return dict((class_name(variable.data), section['name'] if section is not None else None)
+		for variable, section in assignment.iteritems())
+
+
+"""
+Pool initializer, keeps the worker's copy of the service
+"""
+def load_service(data):
+	global worker_service
+	worker_service = cPickle.loads(data)
+
+
+"""
+Pool initializer, loads the worker's copy of the service from a file
+"""
+def load_service_file(path):
+	global worker_service
+	worker_service = load_compiled(path)
+
+
+"""
+Solves a request in a worker.
+
+Args:
+	request ((int, (list<string>, dictionary<string, ?>))): the position of the request, its classes and parameters
+Returns:
+	(int, ?) the position and the result from solve
+"""
+def solve_request(request):
+	index, (classes_considered, parameters) = request
+	return index, worker_service.solve(classes_considered, parameters)
@@ -0,0 +1,25 @@
+from ScheduleService import ScheduleService, class_name
+from CatalogGenerator import generate_catalog
+from ConstraintParser import create_variables, create_problem
+from TestHelpers import generate_requests
+import copy
+
+def service_test():
+	catalog = generate_catalog(11, 40, 5)
+	requests = generate_requests(5, catalog, 30, 4, 8)
+
+	# Each request solved on its own copy of the catalog, without the overlap index
+	expected = []
+	for classes_considered, parameters in requests:
+		considered = copy.deepcopy([entry for entry in catalog if class_name(entry[0]) in classes_considered])
+		solution = create_problem(create_variables(considered), parameters).solve()
+		expected.append(solution is not None)
+
+	service = ScheduleService(catalog)
+	serial = dict(service.solve_all(requests))
+	pooled = dict(service.solve_all(requests, processes=2))
+	timed_out = ScheduleService(catalog, node_limit=0).solve(*requests[0])
+	return ([serial[index] is not None for index in xrange(len(requests))] == expected, serial == pooled,
+		sum(expected), timed_out.reason)
+
+print service_test()
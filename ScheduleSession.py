@@ -0,0 +1,135 @@
+"""
+Keeps one student's schedule problem between edits, so adding a class or changing a parameter does not start over.
+
+The problem is an IncrementalProblem. An edit only replaces the constraints of the parameter it touches, and says
+whether the new ones rule out at least as much as the old ones so the pruning already done can be kept.
+Each solve tries the sections of the previous schedule first.
+"""
+
+from ConstraintSolver import IncrementalProblem
+from ConstraintParser import create_variables, parameter_types, create_parameter_constraints
+from SchedulingConstraints import compile_sections, parse_minutes
+
+
+class ScheduleSession:
+	"""
+	Args:
+		classes (list<(dictionary, list<dictionary>)>): class info and sections, as given by CatalogLoader.load_classes
+		parameters (dictionary<string, ?>): options and preferences, see ConstraintParser.create_schedule
+		use_tables (boolean): check overlaps with pairwise constraints and compatibility tables
+	"""
+	def __init__(self, classes, parameters, use_tables=False):
+		self.parameters = dict(parameters)
+		self.use_tables = use_tables
+		self.variables = create_variables(classes)
+		compile_sections(self.variables)
+		# Constraints and soft constraints made for each group from parameter_types, each group gets its own copy of
+		# the variables list since constraints keep the list they are given
+		self.constraints = {}
+		self.soft_constraints = {}
+		constraints = []
+		for ptype in parameter_types(self.parameters):
+			hard, soft = create_parameter_constraints(ptype, self.parameters, list(self.variables), use_tables)
+			self.constraints[ptype] = hard
+			self.soft_constraints[ptype] = soft
+			constraints += hard
+		self.problem = IncrementalProblem(list(self.variables), constraints, use_tables)
+		self.update_soft_constraints()
+
+	"""
+	Makes a schedule, see ConstraintSatisfactionProblem.solve for the arguments and result
+	"""
+	def solve(self, deadline=None, node_limit=None, cancel=None):
+		return self.problem.solve(deadline, node_limit, cancel)
+
+	def add_class(self, class_info, sections):
+		variable = create_variables([(class_info, sections)])[0]
+		compile_sections([variable])
+		self.variables.append(variable)
+		self.problem.add_variable(variable)
+		# Constraints over one more class rule out everything they did, except that a minimum of hours is easier to reach
+		for ptype in self.constraints.keys():
+			self.replace_constraints(ptype, ptype == 'hours' and self.parameters.get('min_hours') is not None)
+
+	"""
+	Args:
+		name (string): the class in the format '[school] [number]'
+	"""
+	def remove_class(self, name):
+		variable = self.find_variable(name)
+		for ptype in self.constraints:
+			for constraint in self.constraints[ptype]:
+				self.problem.remove_constraint(constraint)
+			self.constraints[ptype] = []
+		self.variables.remove(variable)
+		self.problem.remove_variable(variable)
+		for ptype in self.constraints.keys():
+			self.replace_constraints(ptype, True)
+
+	def set_parameter(self, name, value):
+		old_value = self.parameters.get(name)
+		self.parameters[name] = value
+		self.update_parameter(name, not tightens(name, old_value, value))
+
+	def remove_parameter(self, name):
+		del self.parameters[name]
+		self.update_parameter(name, True)
+
+	def update_parameter(self, name, loosens):
+		ptype = 'hours' if name in ('min_hours', 'max_hours') else name
+		if ptype not in parameter_types(self.parameters):
+			for constraint in self.constraints.pop(ptype, []):
+				self.problem.remove_constraint(constraint, loosens)
+			self.soft_constraints.pop(ptype, None)
+			self.update_soft_constraints()
+		else:
+			self.constraints.setdefault(ptype, [])
+			self.replace_constraints(ptype, loosens)
+
+	"""
+	Makes the constraints of a group again over the current classes and parameters
+
+	Args:
+		loosens (boolean): whether the new constraints may rule out less than the old ones
+	"""
+	def replace_constraints(self, ptype, loosens):
+		for constraint in self.constraints[ptype]:
+			self.problem.remove_constraint(constraint, loosens)
+		hard, soft = create_parameter_constraints(ptype, self.parameters, list(self.variables), self.use_tables)
+		for constraint in hard:
+			self.problem.add_constraint(constraint)
+		self.constraints[ptype] = hard
+		self.soft_constraints[ptype] = soft
+		self.update_soft_constraints()
+
+	def update_soft_constraints(self):
+		self.problem.soft_constraints = [constraint for ptype in parameter_types(self.parameters)
+			for constraint in self.soft_constraints.get(ptype, [])]
+
+	def find_variable(self, name):
+		for variable in self.variables:
+			if str(variable.data['school']) + ' ' + str(variable.data['name']) == name:
+				return variable
+		raise KeyError(name)
+
+
+"""
+Determines whether changing a parameter from old_value to value only rules out more schedules.
+Preferences never rule out a schedule.
+"""
+def tightens(name, old_value, value):
+	if name in ('minimize_gaps', 'prefer_start', 'minimize_days', 'preferred_professors'):
+		return True
+	if old_value is None:
+		return True
+	if name == 'day_start':
+		return parse_minutes(value) >= parse_minutes(old_value)
+	if name == 'day_end':
+		return parse_minutes(value) <= parse_minutes(old_value)
+	if name == 'min_hours':
+		return value >= old_value
+	if name == 'max_hours':
+		return value <= old_value
+	if name == 'classes_needed':
+		return set(value) >= set(old_value)
+	return False
@@ -0,0 +1,29 @@
+from ScheduleSession import ScheduleSession
+from CatalogGenerator import generate_catalog, format_time
+from TestHelpers import section_names
+
+def session_test():
+	catalog = generate_catalog(3, 8, 4, 0.5)
+	parameters = {'min_hours': 6, 'max_hours': 12}
+	session = ScheduleSession(catalog[:5], parameters)
+	results = [section_names(session.solve())]
+
+	# Tightening keeps the pruning, adding a class or lowering the minimum redoes it
+	session.set_parameter('day_start', format_time(10 * 60))
+	session.add_class(*catalog[5])
+	session.set_parameter('min_hours', 3)
+	solution = session.solve()
+	results.append(len(solution))
+	results.append(all(start >= 10 * 60 for section in solution.values() if section is not None
+		for days, start, end in section['compiled']))
+
+	# Needing every class cannot be met within twelve hours
+	session.set_parameter('classes_needed', [info['school'] + ' ' + info['name'] for info, sections in catalog[:6]])
+	results.append(session.solve())
+	session.remove_parameter('classes_needed')
+	session.remove_class(catalog[0][0]['school'] + ' ' + catalog[0][0]['name'])
+	results.append(len(session.solve()))
+	return results
+
+for result in session_test():
+	print result
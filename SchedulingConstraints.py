@@ -12,19 +12,398 @@
 
 """
 Each constraint function must take in applicable variables, a value map, and extras.
+Functions marked @positional take a list of values in the order of the variables instead of a value map,
+with UNASSIGNED for variables without a value.
 Required extras should be specified, as well as the number of variables.
 Returns True if satisfied or False otherwise.
 Is satisfaction is unclear, return True.
 """
 
-from ConstraintSolver import Constraint
+from ConstraintSolver import Constraint, LinearSumConstraint, SoftConstraint, Domain, UNASSIGNED, positional, symmetric
+from array import array
+from bisect import bisect_right
+from operator import itemgetter
 import time
 
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+# Cache of parsed time strings, there are only a handful of distinct times in a catalog
+parsed_minutes = {}
+
+"""
+Converts a time string in the format '2000-01-01T%H:%M:%SZ' to minutes past midnight.
+"""
+def parse_minutes(time_string):
+	if time_string not in parsed_minutes:
+		parsed = time.strptime(time_string, '2000-01-01T%H:%M:%SZ')
+		parsed_minutes[time_string] = parsed.tm_hour * 60 + parsed.tm_min
+	return parsed_minutes[time_string]
+
+"""
+Converts the days a meeting is held on to a bitmask, monday is the lowest bit.
+"""
+def day_mask(meeting):
+	mask = 0
+	for bit, day in enumerate(DAYS):
+		if meeting[day]:
+			mask |= 1 << bit
+	return mask
+
+"""
+Compiles the meetings of a section into a tuple of (day mask, start minute, end minute) records.
+The result is stored in the section under 'compiled' so the meeting strings are only parsed once.
 """
-Creates binary constraints for ensuring classes do not overlap.
-This should be used for any scheduler.
+def compile_section(section):
+	if 'compiled' not in section:
+		section['compiled'] = tuple((day_mask(meeting), parse_minutes(meeting['start_time']), parse_minutes(meeting['end_time']))
+			for meeting in section['meetings'])
+	return section['compiled']
+
+"""
+Groups the compiled meetings of a section by day bit, as sorted (start minute, end minute) lists.
+Overlapping meetings of the same section are merged, so the intervals of a day never overlap each other.
+The result is stored in the section under 'days'.
+"""
+def section_days(section):
+	if 'days' not in section:
+		days = {}
+		for mask, start, end in compile_section(section):
+			for bit in xrange(len(DAYS)):
+				if mask >> bit & 1:
+					days.setdefault(bit, []).append((start, end))
+		for bit, meetings in days.iteritems():
+			meetings.sort()
+			merged = [meetings[0]]
+			for start, end in meetings[1:]:
+				if start < merged[-1][1]:
+					merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+				else:
+					merged.append((start, end))
+			days[bit] = merged
+		section['days'] = days
+	return section['days']
+
+"""
+Compiles every section in the domains of the given variables. The None "not taking" value is skipped.
+"""
+def compile_sections(variables):
+	for variable in variables:
+		for section in (section for section in variable.domain if section is not None):
+			compile_section(section)
+			section_days(section)
+
+"""
+Compiles every section of a catalog and indexes which sections overlap, so many schedules can be made from it
+without comparing meeting times again. Each section gets a catalog wide number under 'id', and under 'overlaps'
+a bitset of the ids of the sections of other classes it overlaps. Each day's meetings are swept in order of start
+time, keeping the meetings that have not ended yet.
+
+Args:
+	classes (list<(dictionary, list<dictionary>)>): class info and sections, as given by CatalogLoader.load_classes
+Returns:
+	SectionColumns for the sections of every class
+"""
+def compile_catalog(classes):
+	days = {}
+	section_id = 0
+	for class_id, (class_info, sections) in enumerate(classes):
+		for section in sections:
+			# The position of the section in the SectionColumns
+			section['id'] = section_id
+			section['overlaps'] = 0
+			section_id += 1
+			for bit, meetings in section_days(section).iteritems():
+				days.setdefault(bit, []).extend((start, end, class_id, section) for start, end in meetings)
+
+	for meetings in days.itervalues():
+		meetings.sort(key=itemgetter(0))
+		active = []
+		for start, end, class_id, section in meetings:
+			active = [meeting for meeting in active if meeting[0] > start]
+			for active_end, active_class, active_section in active:
+				if active_class != class_id:
+					section['overlaps'] |= 1 << active_section['id']
+					active_section['overlaps'] |= 1 << section['id']
+			active.append((end, class_id, section))
+	return SectionColumns(classes)
+
+"""
+	Class to store the times of sections in columns by position, the order they were given in, so filters on them
+	are worked out for all of them at once. Each start and end time is indexed by a bitset of the positions of the
+	sections with it, there are only a handful of distinct times, so a filter on times is a few bitset operations
+	instead of a test of every section. The result of each filter is kept for the next that uses it.
+"""
+class SectionColumns:
+	"""
+	Args:
+		classes (list<(dictionary, list<dictionary>)>): class info and compiled sections
+	"""
+	def __init__(self, classes):
+		self.sections = [section for class_info, sections in classes for section in sections]
+		# Columns of the earliest start and latest end of each section's meetings, a section without meetings fits
+		# in any window
+		self.earliest = array('i')
+		self.latest = array('i')
+		for section in self.sections:
+			meetings = compile_section(section)
+			self.earliest.append(min([start for mask, start, end in meetings] or [24 * 60]))
+			self.latest.append(max([end for mask, start, end in meetings] or [0]))
+		self.starts = index_column(self.earliest)
+		self.ends = index_column(self.latest)
+		self.windows = {}
+		self.positions = dict((id(section), position) for position, section in enumerate(self.sections))
+
+	"""
+	Finds the sections with a meeting outside a time window, the same sections day_start_constraint
+	and day_end_constraint rule out.
+
+	Args:
+		day_start, day_end (string): in the format '2000-01-01T%H:%M:%SZ', either may be None
+	Returns:
+		int, a bitset of the positions of the sections outside the window
+	"""
+	def outside_window(self, day_start=None, day_end=None):
+		key = (day_start, day_end)
+		if key not in self.windows:
+			start = parse_minutes(day_start) if day_start is not None else 0
+			end = parse_minutes(day_end) if day_end is not None else 24 * 60
+			outside = 0
+			for minute, positions in self.starts.iteritems():
+				if minute < start:
+					outside |= positions
+			for minute, positions in self.ends.iteritems():
+				if minute > end:
+					outside |= positions
+			self.windows[key] = outside
+		return self.windows[key]
+
+	"""
+	Takes the sections outside a time window out of the domains of variables whose sections are in the columns,
+	see outside_window. Call before any constraints are made on the variables, their domains are replaced.
+	"""
+	def remove_outside_window(self, variables, day_start=None, day_end=None):
+		outside = self.outside_window(day_start, day_end)
+		if not outside:
+			return
+		positions = self.positions
+		for variable in variables:
+			values = list(variable.domain)
+			kept = [value for value in values if value is None or not outside >> positions[id(value)] & 1]
+			if len(kept) < len(values):
+				variable.domain = Domain(kept)
+
+	# Positions are looked up by identity, which does not survive pickling, so they are rebuilt on load
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		del state['positions']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.positions = dict((id(section), position) for position, section in enumerate(self.sections))
+
+"""
+Groups the positions in a column by value, as a bitset of the positions with each value
+"""
+def index_column(column):
+	index = {}
+	for position, value in enumerate(column):
+		index[value] = index.get(value, 0) | 1 << position
+	return index
+
+"""
+Groups the meetings of the sections in value_map by day, as lists of (start minute, end minute) for each day bit.
+"""
+def meetings_by_day(value_map):
+	days = {}
+	for section in (section for section in value_map.itervalues() if section is not None):
+		for bit, meetings in section_days(section).iteritems():
+			days.setdefault(bit, []).extend(meetings)
+	return days
+
+
+"""
+Creates a single constraint for ensuring classes do not overlap, which prunes sections that collide with
+the sections already chosen. This should be used for any scheduler. Classes whose sections can never overlap are
+not linked by it, so they are searched apart.
+Uses the overlap index when every section was indexed together by compile_catalog.
 """
 def create_no_overlap_constraints(variables):
+	sections = [section for variable in variables for section in variable.domain.values if section is not None]
+	if sections and all('overlaps' in section for section in sections):
+		return [Constraint(variables, indexed_no_overlap_constraint, propagate=indexed_no_overlap_propagate,
+			entailed=indexed_no_overlap_entailed, links=indexed_no_overlap_links)]
+	return [Constraint(variables, no_overlap_all_constraint, propagate=no_overlap_propagate, entailed=no_overlap_entailed,
+		links=no_overlap_links)]
+
+"""
+Tests that no two sections overlap. Each day's meetings are swept in order of start time, a meeting
+overlaps an earlier one if it starts before the latest end seen so far.
+
+Variables: 1...n
+Extras:
+	None
+"""
+@symmetric
+def no_overlap_all_constraint(variables, value_map, extras):
+	for meetings in meetings_by_day(value_map).itervalues():
+		meetings.sort()
+		latest_end = meetings[0][1]
+		for start, end in meetings[1:]:
+			if start < latest_end:
+				return False
+			latest_end = max(latest_end, end)
+	return True
+
+"""
+Propagates no_overlap_all_constraint, removing sections of unassigned classes that overlap a meeting of an assigned class.
+"""
+def no_overlap_propagate(variables, extras):
+	# Fixed meetings of each day, sorted by start. They do not overlap, so their ends are sorted too
+	fixed = {}
+	for variable in (var for var in variables if var.assigned and var.value is not None):
+		for bit, meetings in section_days(variable.value).iteritems():
+			fixed.setdefault(bit, []).extend((start, end, variable) for start, end in meetings)
+	if not fixed:
+		return []
+	days = {}
+	for bit, meetings in fixed.iteritems():
+		meetings.sort(key=itemgetter(0))
+		days[bit] = ([end for start, end, owner in meetings], meetings)
+
+	removed = []
+	for variable in (var for var in variables if not var.assigned):
+		for section in (section for section in variable.domain if section is not None):
+			culprit = find_collision(section, days)
+			if culprit is not None:
+				removed.append((variable, section, (culprit,)))
+	return removed
+
+"""
+Finds the pairs of classes with sections left that overlap, the pairs no_overlap_all_constraint can fail on.
+Each day's meetings are swept in order of start time, keeping the meetings that have not ended yet.
+"""
+def no_overlap_links(variables, extras):
+	days = {}
+	for variable in variables:
+		for section in (section for section in variable.domain if section is not None):
+			for bit, meetings in section_days(section).iteritems():
+				days.setdefault(bit, []).extend((start, end, variable) for start, end in meetings)
+	links = set([])
+	for meetings in days.itervalues():
+		meetings.sort(key=itemgetter(0))
+		active = []
+		for start, end, variable in meetings:
+			active = [meeting for meeting in active if meeting[0] > start]
+			for active_end, other in active:
+				if other is not variable:
+					links.add(frozenset((other, variable)))
+			active.append((end, variable))
+	return [tuple(pair) for pair in links]
+
+"""
+Tells whether no section left for a class overlaps one left for another, then any choice satisfies
+no_overlap_all_constraint
+"""
+def no_overlap_entailed(variables, extras):
+	return not no_overlap_links(variables, extras)
+
+"""
+Finds the class of a fixed meeting that a section overlaps, or None. The first fixed meeting ending after a
+meeting starts is the only one that can overlap it.
+"""
+def find_collision(section, days):
+	for bit, section_meetings in section_days(section).iteritems():
+		if bit in days:
+			ends, meetings = days[bit]
+			for start, end in section_meetings:
+				index = bisect_right(ends, start)
+				if index < len(meetings) and meetings[index][0] < end:
+					return meetings[index][2]
+	return None
+
+"""
+Tests that no two sections overlap with the index from compile_catalog.
+
+Variables: 1...n
+Extras:
+	None
+"""
+@positional
+@symmetric
+def indexed_no_overlap_constraint(variables, values, extras):
+	overlaps = 0
+	for section in values:
+		if section is None or section is UNASSIGNED:
+			continue
+		if overlaps >> section['id'] & 1:
+			return False
+		overlaps |= section['overlaps']
+	return True
+
+"""
+Propagates indexed_no_overlap_constraint, removing sections of unassigned classes that overlap a section of an assigned class.
+"""
+def indexed_no_overlap_propagate(variables, extras):
+	overlaps = 0
+	fixed = []
+	for variable in (var for var in variables if var.assigned and var.value is not None):
+		overlaps |= variable.value['overlaps']
+		fixed.append(variable)
+	if not overlaps:
+		return []
+
+	removed = []
+	for variable in (var for var in variables if not var.assigned):
+		for section in (section for section in variable.domain if section is not None):
+			if overlaps >> section['id'] & 1:
+				for culprit in fixed:
+					if culprit.value['overlaps'] >> section['id'] & 1:
+						removed.append((variable, section, (culprit,)))
+						break
+	return removed
+
+"""
+Tells whether no section left for a class overlaps one left for another, then any choice satisfies
+indexed_no_overlap_constraint. Sections of the same class may overlap, only one of them is taken.
+"""
+def indexed_no_overlap_entailed(variables, extras):
+	overlaps = 0
+	for variable in variables:
+		sections = [section for section in variable.domain if section is not None]
+		for section in sections:
+			if overlaps >> section['id'] & 1:
+				return False
+		for section in sections:
+			overlaps |= section['overlaps']
+	return True
+
+"""
+Finds the pairs of classes with sections left that overlap with the index from compile_catalog
+"""
+def indexed_no_overlap_links(variables, extras):
+	# Bitsets of the ids of each class's sections left, and of the sections they overlap
+	classes = []
+	for variable in variables:
+		sections = 0
+		overlaps = 0
+		for section in (section for section in variable.domain if section is not None):
+			sections |= 1 << section['id']
+			overlaps |= section['overlaps']
+		classes.append((variable, sections, overlaps))
+	links = []
+	for position, (variable, sections, overlaps) in enumerate(classes):
+		# Overlapping is symmetric, each pair is only looked at once
+		for other, other_sections, other_overlaps in classes[position + 1:]:
+			if overlaps & other_sections:
+				links.append((variable, other))
+	return links
+
+"""
+Creates binary constraints for ensuring classes do not overlap, one for each ordered pair of classes.
+Useful with compatibility tables, create_no_overlap_constraints scales better.
+"""
+def create_pairwise_no_overlap_constraints(variables):
 	constraints = []
 	for var1 in variables:
 		for var2 in (var for var in variables if var != var1):
@@ -38,32 +417,39 @@ Variables: 2
 Extras:
 	None
 """
-def no_overlap_constraint(variables, value_map, extras):
-	if variables[0] not in value_map or variables[1] not in value_map:
-		return True
-
-	section1 = value_map[variables[0]]
-	section2 = value_map[variables[1]]
+@positional
+@symmetric
+def no_overlap_constraint(variables, values, extras):
+	section1, section2 = values
 
-	if section1 is None or section2 is None:
+	if section1 is None or section2 is None or section1 is UNASSIGNED or section2 is UNASSIGNED:
 		return True
-	
-	for meeting1 in section1['meetings']:
-		for meeting2 in section2['meetings']:
-			day_overlap = False
-			for day in (day for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday'] if meeting1[day] and meeting2[day]):
-				day_overlap = True
-			if day_overlap:
-				start1 = time.strptime(meeting1['start_time'], '2000-01-01T%H:%M:%SZ')
-				start2 = time.strptime(meeting2['start_time'], '2000-01-01T%H:%M:%SZ')
-				end1 = time.strptime(meeting1['end_time'], '2000-01-01T%H:%M:%SZ')
-				end2 = time.strptime(meeting2['end_time'], '2000-01-01T%H:%M:%SZ')
 
+	for days1, start1, end1 in compile_section(section1):
+		for days2, start2, end2 in compile_section(section2):
+			if days1 & days2:
 				if (start1 > start2 and start1 < end2) or (start2 > start1 and start2 < end1) or (start1 == start2) or (end1 == end2):
 					return False
 	return True
 
 
+"""
+Creates a constraint keeping the hours taken between min_hours and max_hours, either may be None.
+Sections or not taking a class that would make the limits unreachable are pruned during search.
+Preferrable to use this instead of max_hours_constraint and min_hours_constraint.
+"""
+def create_credit_hours_constraints(variables, min_hours=None, max_hours=None):
+	return [LinearSumConstraint(variables, credit_weight, minimum=min_hours, maximum=max_hours)]
+
+"""
+Gives the hours of a section, nothing if the class is not taken.
+"""
+def credit_weight(variable, section):
+	if section is None:
+		return 0
+	return float(variable.data['credits'])
+
+
 """
 Limits the maximum number of hours taken.
 
@@ -71,6 +457,7 @@ Variables: 1...n
 Extras:
 	max_hours
 """
+@symmetric
 def max_hours_constraint(variables, value_map, extras):
 	max_hours = extras['max_hours']
 	hours = 0
@@ -88,6 +475,7 @@ Variables: 1...n
 Extras:
 	min_hours
 """
+@symmetric
 def min_hours_constraint(variables, value_map, extras):
 	if len(variables) > len(value_map):
 		return True
@@ -114,11 +502,14 @@ Variables: 1...n
 Extras:
 	day_start
 """
-def day_start_constraint(variables, value_map, extras):
-	day_start = time.strptime(extras['day_start'], '2000-01-01T%H:%M:%SZ')
-	for variable in (var for var in value_map if value_map[var] is not None):
-		for meeting in value_map[variable]['meetings']:
-			if time.strptime(meeting['start_time'], '2000-01-01T%H:%M:%SZ') < day_start:
+@positional
+def day_start_constraint(variables, values, extras):
+	day_start = parse_minutes(extras['day_start'])
+	for section in values:
+		if section is None or section is UNASSIGNED:
+			continue
+		for days, start, end in compile_section(section):
+			if start < day_start:
 				return False
 	return True
 
@@ -136,11 +527,14 @@ Variables: 1...n
 Extras:
 	day_end
 """
-def day_end_constraint(variables, value_map, extras):
-	day_end = time.strptime(extras['day_end'], '2000-01-01T%H:%M:%SZ')
-	for variable in (var for var in value_map if value_map[var] is not None):
-		for meeting in value_map[variable]['meetings']:
-			if time.strptime(meeting['end_time'], '2000-01-01T%H:%M:%SZ') > day_end:
+@positional
+def day_end_constraint(variables, values, extras):
+	day_end = parse_minutes(extras['day_end'])
+	for section in values:
+		if section is None or section is UNASSIGNED:
+			continue
+		for days, start, end in compile_section(section):
+			if end > day_end:
 				return False
 	return True
 
@@ -152,8 +546,9 @@ Variables: 1
 Extras:
 	None
 """
-def needed_class_constraint(variables, value_map, extras):
-	if value_map[variables[0]] is None:
+@positional
+def needed_class_constraint(variables, values, extras):
+	if values[0] is None:
 		return False
 	return True
 
@@ -190,12 +585,146 @@ Extras:
 	classes_taken
 	prereq
 """
-def class_prereq_constraint(variables, value_map, extras):
-	if value_map[variables[0]] is None:
+@positional
+def class_prereq_constraint(variables, values, extras):
+	if values[0] is None:
 		return True
 
 	classes_taken = extras['classes_taken']
 	prereq = extras['prereq']
 	if prereq in classes_taken:
 		return True
-	return False
\ No newline at end of file
+	return False
+
+
+# Preferences, soft constraints for optimizing a schedule. Cost functions take the same arguments as constraints.
+
+"""
+Gives the minutes spent waiting between classes on each day bit.
+"""
+def day_gaps(value_map):
+	gaps = {}
+	for bit, meetings in meetings_by_day(value_map).iteritems():
+		meetings.sort()
+		gaps[bit] = 0
+		latest_end = meetings[0][1]
+		for start, end in meetings[1:]:
+			if start > latest_end:
+				gaps[bit] += start - latest_end
+			latest_end = max(latest_end, end)
+	return gaps
+
+"""
+Creates a soft constraint for minimizing the time between classes.
+"""
+def create_idle_gap_constraints(variables, weight):
+	return [SoftConstraint(variables, idle_gap_cost, idle_gap_lower_bound, weight)]
+
+"""
+Costs the number of minutes between classes on the same day.
+
+Variables: 1...n
+Extras:
+	None
+"""
+@symmetric
+def idle_gap_cost(variables, value_map, extras):
+	return sum(day_gaps(value_map).itervalues())
+
+"""
+Bounds idle_gap_cost. Adding a class can shorten the gaps on a day by at most the length of its meetings that day.
+"""
+def idle_gap_lower_bound(variables, value_map, extras):
+	gaps = day_gaps(value_map)
+	for variable in (var for var in variables if var not in value_map):
+		for bit in gaps:
+			most = 0
+			for section in (section for section in variable.domain if section is not None):
+				most = max(most, sum(end - start for mask, start, end in compile_section(section) if mask >> bit & 1))
+			gaps[bit] -= most
+	return sum(max(gap, 0) for gap in gaps.itervalues())
+
+
+"""
+Creates a soft constraint preferring the first class of each day to start no earlier than start_time.
+"""
+def create_late_start_constraints(start_time, variables):
+	return [SoftConstraint(variables, early_start_cost, early_start_cost, preferred_start=start_time)]
+
+"""
+Costs the minutes the first class of each day starts before the preferred start.
+Adding classes never lowers this cost, so it is its own lower bound.
+
+Variables: 1...n
+Extras:
+	preferred_start
+"""
+@symmetric
+def early_start_cost(variables, value_map, extras):
+	preferred_start = parse_minutes(extras['preferred_start'])
+	cost = 0
+	for meetings in meetings_by_day(value_map).itervalues():
+		cost += max(0, preferred_start - min(start for start, end in meetings))
+	return cost
+
+
+"""
+Creates a soft constraint for minimizing the number of days spent on campus.
+"""
+def create_campus_days_constraints(variables, weight):
+	return [SoftConstraint(variables, campus_days_cost, campus_days_lower_bound, weight)]
+
+"""
+Costs the number of days with a class.
+
+Variables: 1...n
+Extras:
+	None
+"""
+@symmetric
+def campus_days_cost(variables, value_map, extras):
+	return len(meetings_by_day(value_map))
+
+"""
+Bounds campus_days_cost by the days already used plus the fewest new days any one unassigned class must add.
+"""
+def campus_days_lower_bound(variables, value_map, extras):
+	used = 0
+	for section in (section for section in value_map.itervalues() if section is not None):
+		for mask, start, end in compile_section(section):
+			used |= mask
+	forced = 0
+	for variable in (var for var in variables if var not in value_map):
+		fewest = None
+		for section in variable.domain:
+			added = 0
+			if section is not None:
+				for mask, start, end in compile_section(section):
+					added |= mask & ~used
+			added = bin(added).count('1')
+			if fewest is None or added < fewest:
+				fewest = added
+		forced = max(forced, fewest or 0)
+	return bin(used).count('1') + forced
+
+
+"""
+Creates unary soft constraints for taking classes from the preferred professors.
+Each class taken with another professor costs as much as an hour between classes.
+"""
+def create_professor_preference_constraints(professors, variables):
+	return [SoftConstraint([variable], professor_preference_cost, weight=60, preferred_professors=professors) for variable in variables]
+
+"""
+Costs a class taken with a professor that is not preferred.
+
+Variables: 1
+Extras:
+	preferred_professors
+"""
+def professor_preference_cost(variables, value_map, extras):
+	if value_map.get(variables[0]) is None:
+		return 0
+	if variables[0].data.get('professor') in extras['preferred_professors']:
+		return 0
+	return 1
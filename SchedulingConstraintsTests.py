@@ -0,0 +1,103 @@
+from SchedulingConstraints import no_overlap_all_constraint, no_overlap_propagate, indexed_no_overlap_propagate, compile_catalog, \
+	day_start_constraint, day_end_constraint
+from ConstraintSolver import ConstraintSatisfactionProblem
+from ConstraintParser import create_variables, create_problem, create_parameter_constraints
+from CatalogGenerator import format_time, generate_catalog, DAYS
+import copy
+
+def make_section(name, *meetings):
+	# Each meeting is (days, start minute, end minute)
+	section = {'name': name, 'meetings': []}
+	for days, start, end in meetings:
+		meeting = dict((day, day in days) for day in DAYS)
+		meeting['start_time'] = format_time(start)
+		meeting['end_time'] = format_time(end)
+		section['meetings'].append(meeting)
+	return section
+
+def make_class(name, *sections):
+	return ({'school': 'CS', 'name': name, 'credits': '3'}, list(sections))
+
+def removal_names(removed):
+	return sorted((variable.data['name'], section['name'], [culprit.data['name'] for culprit in culprits])
+		for variable, section, culprits in removed)
+
+def no_overlap_propagate_test():
+	mwf = ('monday', 'wednesday', 'friday')
+	tr = ('tuesday', 'thursday')
+	catalog = [
+		make_class('1100', make_section('A', (mwf, 9 * 60, 9 * 60 + 50))),
+		make_class('1200', make_section('A', (tr, 12 * 60, 13 * 60 + 15))),
+		make_class('1300',
+			# Starts before the monday class ends
+			make_section('A', (mwf, 9 * 60 + 30, 10 * 60 + 20)),
+			# Ends as the tuesday class starts, then a lab that runs into it
+			make_section('B', (tr, 11 * 60, 12 * 60), (('thursday',), 12 * 60 + 30, 14 * 60)),
+			# A lecture and a lab of its own that overlap each other, but neither class
+			make_section('C', (('monday',), 13 * 60, 14 * 60), (('monday',), 13 * 60 + 30, 15 * 60)),
+			make_section('D', (tr, 9 * 60, 10 * 60 + 15)))
+	]
+	variables = create_variables(catalog)
+	for variable in variables[:2]:
+		variable.set_value(variable.domain.values[0])
+	removed = no_overlap_propagate(variables, {})
+
+	# The overlap index blames the same classes, and a section overlapping itself still fits on its own
+	compile_catalog(catalog)
+	indexed = indexed_no_overlap_propagate(variables, {})
+	own = no_overlap_all_constraint(variables[2:], {variables[2]: catalog[2][1][2]}, {})
+	return removal_names(removed), removal_names(indexed) == removal_names(removed), own
+
+def window_test():
+	catalog = generate_catalog(7, 30, 6)
+	columns = compile_catalog(catalog)
+	sections = [section for class_info, class_sections in catalog for section in class_sections]
+	results = []
+	for day_start, day_end in ((10 * 60, 16 * 60), (11 * 60 + 30, None), (None, 14 * 60), (None, None)):
+		start = format_time(day_start) if day_start is not None else None
+		end = format_time(day_end) if day_end is not None else None
+		# The mask rules out the same sections as the unary constraints
+		outside = columns.outside_window(start, end)
+		expected = [(start is not None and not day_start_constraint(None, [section], {'day_start': start})) or
+			(end is not None and not day_end_constraint(None, [section], {'day_end': end})) for section in sections]
+		matches = [bool(outside >> section['id'] & 1) for section in sections] == expected
+
+		# A problem with the window in its domains has the schedules of one with the unary constraints
+		considered = copy.deepcopy(catalog[:6])
+		parameters = dict((ptype, value) for ptype, value in (('day_start', start), ('day_end', end), ('max_hours', 12))
+			if value is not None)
+		masked = create_problem(create_variables(considered), parameters)
+		variables = create_variables(considered)
+		constraints = []
+		for ptype in ('day_start', 'day_end', 'hours', 'no_overlap'):
+			if ptype in ('hours', 'no_overlap') or ptype in parameters:
+				constraints += create_parameter_constraints(ptype, parameters, variables)[0]
+		unary = ConstraintSatisfactionProblem(variables, constraints)
+		results.append((sum(expected), matches, len(masked.unary_constraints), masked.count_solutions() == unary.count_solutions()))
+	return results
+
+def components_test():
+	# Three classes only on monday, wednesday and friday and three only on tuesday and thursday, each week half is
+	# searched apart whether the overlaps are checked by one constraint, the overlap index or the tables
+	mwf = ('monday', 'wednesday', 'friday')
+	tr = ('tuesday', 'thursday')
+	catalog = []
+	for days, length, name in ((mwf, 50, 'MWF'), (tr, 75, 'TR')):
+		for number in xrange(3):
+			catalog.append(make_class(name + str(number), *[make_section(str(start), (days, start * 60, start * 60 + length))
+				for start in xrange(9, 12)]))
+	results = []
+	for indexed, use_tables in ((False, False), (True, False), (False, True)):
+		considered = copy.deepcopy(catalog)
+		if indexed:
+			compile_catalog(considered)
+		problem = create_problem(create_variables(considered), {}, use_tables)
+		count = problem.count_solutions()
+		statistics = problem.statistics()
+		results.append((statistics.components, statistics.entailed, count))
+	return results
+
+print no_overlap_propagate_test()
+for result in window_test():
+	print result
+print components_test()
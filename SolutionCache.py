@@ -0,0 +1,250 @@
+"""
+Remembers the results of solved problems, so asking for the same schedule again is answered without a search.
+
+A problem is looked up by a fingerprint of what it asks: the data and domains of its variables, and the test
+functions, variables and extras of its constraints and soft constraints, along with a version for the catalog the
+values came from. Variables are put in a canonical order first, so the same classes given in another order match,
+and so are the variables of constraints with symmetric test functions.
+A solution is kept as the position of each variable's value among its values, which means the same thing for the
+variables of a matching problem. Problems with no solution are kept too, stopped searches are not.
+The most recently used results are kept in memory, and optionally in a directory so they outlast the process.
+The directory is bounded too, once it holds more files than its capacity the least recently used are removed.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+from AtomicFile import atomic_file
+from ConstraintSolver import Variable, Timeout
+
+
+"""
+	Raised by canonical for something it cannot describe the same way in every process, like a lambda
+"""
+class Unfingerprintable(Exception):
+	pass
+
+
+class SolutionCache:
+	"""
+	Args:
+		capacity (int): most results kept in memory
+		cache_dir (string): optional, directory to keep results in as well, read when one is not in memory
+		version (string): optional, identifies the catalog, results from another version are not used
+		describe (function): optional, gives something shorter that identifies a variable's data or one of its values
+			within the version, like the id of a section in a compiled catalog. Must be a named function
+		disk_capacity (int): most results kept in cache_dir
+	"""
+	def __init__(self, capacity=1000, cache_dir=None, version=None, describe=None, disk_capacity=10000):
+		self.capacity = capacity
+		self.cache_dir = cache_dir
+		self.version = version
+		self.describe = describe
+		self.disk_capacity = disk_capacity
+		# Fingerprint to result, least recently used first
+		self.results = OrderedDict()
+		# Counts of how each problem was answered, for checking the cache works
+		self.hits = 0
+		self.misses = 0
+		if cache_dir is not None and not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		# Files in cache_dir as of the last listing and the writes since, other processes may write there too
+		self.stored = len(self.cache_files()) if cache_dir is not None else 0
+
+	"""
+	Answers a problem from the cache, or searches and keeps the result
+
+	Args:
+		problem (ConstraintSatisfactionProblem): a problem that has not been searched yet
+		search (function): optional, takes no arguments and returns what problem.solve does, called on a miss.
+			Defaults to problem.solve with no limits
+	Returns:
+		dictionary<Variable, ?>, None if there is no solution, or a Timeout if the search stopped first
+	"""
+	def solve(self, problem, search=None):
+		variables, key = fingerprint(problem, self.version, self.describe)
+		if key is not None:
+			result = self.get(key)
+			if result is not None:
+				self.hits += 1
+				positions = result['solution']
+				if positions is None:
+					return None
+				return dict((variable, domain_values(variable)[position]) for variable, position in zip(variables, positions))
+		self.misses += 1
+		# The search prunes the domains, positions are among the values fingerprinted
+		live = [sorted(variable.domain.live_indices()) for variable in variables]
+		solution = search() if search is not None else problem.solve()
+		if key is not None and not isinstance(solution, Timeout):
+			if solution is None:
+				self.put(key, {'solution': None})
+			else:
+				self.put(key, {'solution': [indices.index(variable.domain.index(solution[variable]))
+					for variable, indices in zip(variables, live)]})
+		return solution
+
+	"""
+	Finds the result kept for a fingerprint
+
+	Returns:
+		dictionary, {'solution': list<int>} or {'solution': None} for no solution, or None if there is none kept
+	"""
+	def get(self, key):
+		result = self.results.pop(key, None)
+		if result is None:
+			result = self.read_cache(key)
+			if result is None:
+				return None
+		self.remember(key, result)
+		return result
+
+	def put(self, key, result):
+		self.remember(key, result)
+		self.write_cache(key, result)
+
+	def remember(self, key, result):
+		self.results.pop(key, None)
+		if len(self.results) >= self.capacity > 0:
+			self.results.popitem(False)
+		if self.capacity > 0:
+			self.results[key] = result
+
+	def __len__(self):
+		return len(self.results)
+
+	def cache_path(self, key):
+		return os.path.join(self.cache_dir, key + '.json')
+
+	def read_cache(self, key):
+		if self.cache_dir is None:
+			return None
+		try:
+			with open(self.cache_path(key)) as cache_file:
+				result = json.load(cache_file)
+			# Marks the file used, files are trimmed by modification time
+			os.utime(self.cache_path(key), None)
+			return result
+		except (IOError, OSError, ValueError):
+			return None
+
+	def write_cache(self, key, result):
+		if self.cache_dir is None:
+			return
+		with atomic_file(self.cache_path(key)) as cache_file:
+			json.dump(result, cache_file)
+		self.stored += 1
+		if self.stored > self.disk_capacity:
+			self.trim_cache()
+
+	def cache_files(self):
+		return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+
+	"""
+	Removes the least recently used files in cache_dir down to a tenth under disk_capacity, so the directory is
+	not listed again on every write
+	"""
+	def trim_cache(self):
+		used = []
+		for path in self.cache_files():
+			try:
+				used.append((os.path.getmtime(path), path))
+			except OSError:
+				# Removed by another process since the listing
+				pass
+		used.sort()
+		kept = self.disk_capacity - self.disk_capacity // 10
+		for modified, path in used[:max(len(used) - kept, 0)]:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+		self.stored = min(len(used), kept)
+
+
+"""
+Gives the values left in a variable's domain, in the order they were given
+"""
+def domain_values(variable):
+	return [variable.domain.values[index] for index in sorted(variable.domain.live_indices())]
+
+
+"""
+Fingerprints a problem
+
+Args:
+	problem (ConstraintSatisfactionProblem): the problem
+	version (string): optional, identifies where the values came from
+	describe (function): optional, see SolutionCache
+Returns:
+	(list<Variable>, string)
+	the variables in canonical order, and a hex digest that matches for the same problem in any process,
+	None if some part of the problem cannot be described, see canonical
+"""
+def fingerprint(problem, version=None, describe=None):
+	try:
+		# Test functions can read a variable's data, like the credits of a class
+		if describe is None:
+			descriptions = dict((variable, (canonical(variable.data), canonical(domain_values(variable))))
+				for variable in problem.variables)
+		else:
+			descriptions = dict((variable, canonical((describe(variable.data), [describe(value) for value in domain_values(variable)])))
+				for variable in problem.variables)
+	except Unfingerprintable:
+		return list(problem.variables), None
+	# Ties are variables with the same data and values, either order describes the problem the same way
+	variables = sorted(problem.variables, key=lambda variable: descriptions[variable])
+	positions = dict((variable, position) for position, variable in enumerate(variables))
+	try:
+		described = [version, [descriptions[variable] for variable in variables]]
+		constraints = problem.unary_constraints + problem.binary_constraints + problem.nary_constraints
+		described.append(sorted(describe_constraint(constraint, positions) for constraint in constraints))
+		described.append(sorted((canonical(constraint.cost), canonical(constraint.bound), constraint.weight,
+			scope(constraint.variables, constraint.cost, positions), canonical(constraint.extras, positions))
+			for constraint in problem.soft_constraints))
+		described.append(canonical(describe))
+	except Unfingerprintable:
+		return variables, None
+	return variables, hashlib.sha1(repr(described)).hexdigest()
+
+
+def describe_constraint(constraint, positions):
+	return (constraint.__class__.__name__, canonical(constraint.test_satisfied), canonical(constraint.propagate),
+		canonical(constraint.entailed), scope(constraint.variables, constraint.test_satisfied, positions),
+		canonical(constraint.extras, positions))
+
+
+"""
+Gives the positions of a constraint's variables, sorted if its function is symmetric
+"""
+def scope(variables, function, positions):
+	described = [canonical(variable, positions)[1] for variable in variables]
+	if getattr(function, 'symmetric', False):
+		described.sort()
+	return tuple(described)
+
+
+"""
+Converts a value to nested tuples of numbers and strings that print the same for equal values in any process.
+Dictionaries and sets are sorted, functions are named by module, variables by their position in positions.
+
+Raises:
+	Unfingerprintable for a lambda, a variable not in positions, or a value of any other type
+"""
+def canonical(value, positions=None):
+	if value is None or isinstance(value, (bool, int, long, float, basestring)):
+		return value
+	if isinstance(value, (list, tuple)):
+		return tuple([canonical(item, positions) for item in value])
+	if isinstance(value, dict):
+		return ('dict', tuple(sorted((canonical(key, positions), canonical(item, positions)) for key, item in value.iteritems())))
+	if isinstance(value, (set, frozenset)):
+		return ('set', tuple(sorted(canonical(item, positions) for item in value)))
+	if isinstance(value, Variable):
+		if positions is None or value not in positions:
+			raise Unfingerprintable(value)
+		return ('variable', positions[value])
+	if callable(value) and hasattr(value, '__module__') and getattr(value, '__name__', '<lambda>') != '<lambda>':
+		return ('function', value.__module__, value.__name__)
+	raise Unfingerprintable(value)
@@ -0,0 +1,61 @@
+from SolutionCache import SolutionCache, fingerprint
+from ConstraintParser import create_variables, create_problem
+from CatalogGenerator import generate_catalog
+from TestHelpers import section_names
+import os
+import shutil
+import tempfile
+
+def schedule_problem(catalog, parameters):
+	return create_problem(create_variables(catalog), parameters)
+
+def cache_test():
+	catalog = generate_catalog(3, 6, 4, 0.5)
+	parameters = {'min_hours': 6, 'max_hours': 12}
+	cache_dir = tempfile.mkdtemp()
+	try:
+		results = []
+		cache = SolutionCache(cache_dir=cache_dir)
+		first = cache.solve(schedule_problem(catalog, parameters))
+
+		# The same classes in another order are answered without a search, with the same sections
+		problem = schedule_problem(list(reversed(catalog)), parameters)
+		second = cache.solve(problem)
+		results.append((cache.hits, cache.misses, section_names(first) == section_names(second), problem.nodes))
+
+		# Changing a parameter makes another problem, one with a lambda in it is not fingerprinted at all
+		results.append(fingerprint(schedule_problem(catalog, {'min_hours': 6, 'max_hours': 9}))[1] != fingerprint(problem)[1])
+		problem = schedule_problem(catalog, parameters)
+		problem.nary_constraints[0].extras['weight'] = lambda variable, section: 0
+		results.append(fingerprint(problem)[1])
+
+		# Having no schedule is remembered, and a new cache reads both results back from disk
+		impossible = {'min_hours': 100}
+		cache.solve(schedule_problem(catalog, impossible))
+		cache = SolutionCache(cache_dir=cache_dir)
+		results.append((cache.solve(schedule_problem(catalog, impossible)),
+			section_names(cache.solve(schedule_problem(catalog, parameters))) == section_names(first), cache.hits))
+
+		# A full cache drops the least recently used result
+		cache = SolutionCache(1)
+		cache.solve(schedule_problem(catalog, parameters))
+		cache.solve(schedule_problem(catalog, impossible))
+		cache.solve(schedule_problem(catalog, parameters))
+		results.append((len(cache), cache.hits, cache.misses))
+
+		# A full directory drops the least recently used file, the latest results are still read back
+		shutil.rmtree(cache_dir)
+		cache = SolutionCache(cache_dir=cache_dir, disk_capacity=2)
+		for maximum in (9, 10, 11):
+			cache.solve(schedule_problem(catalog, {'max_hours': maximum}))
+		files = len(os.listdir(cache_dir))
+		cache = SolutionCache(cache_dir=cache_dir)
+		for maximum in (11, 10, 9):
+			cache.solve(schedule_problem(catalog, {'max_hours': maximum}))
+		results.append((files, cache.hits, cache.misses))
+		return results
+	finally:
+		shutil.rmtree(cache_dir)
+
+for result in cache_test():
+	print result
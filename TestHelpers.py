@@ -0,0 +1,38 @@
+"""
+Helpers shared by the test scripts.
+"""
+
+import random
+
+from CatalogGenerator import generate_parameters
+from ScheduleService import class_name
+
+
+"""
+Lists the class and section names of a solution, sorted so solutions compare and print the same in any process
+"""
+def section_names(solution):
+	return sorted((variable.data['name'], section['name'] if section is not None else None) for variable, section in solution.items())
+
+
+"""
+Generates schedule requests for a catalog, each for a random sample of its classes with generated parameters
+
+Args:
+	seed (int): seed for the random choices
+	catalog (list<(dictionary, list<dictionary>)>): as given by generate_catalog
+	count (int): number of requests
+	smallest, largest (int): fewest and most classes in a request
+Returns:
+	list<(list<string>, dictionary<string, ?>)>
+	the classes considered and the parameters of each request, as ScheduleService.solve_all takes them
+"""
+def generate_requests(seed, catalog, count, smallest, largest):
+	names = [class_name(class_info) for class_info, sections in catalog]
+	rnd = random.Random(seed)
+	requests = []
+	for parameter_seed in xrange(count):
+		classes_considered = rnd.sample(names, rnd.randint(smallest, largest))
+		considered = [entry for entry in catalog if class_name(entry[0]) in classes_considered]
+		requests.append((classes_considered, generate_parameters(parameter_seed, considered, rnd.random())))
+	return requests